@@ -2,58 +2,168 @@
 API module for the Weather Data Pipeline project.
 
 This FastAPI app exposes endpoints to:
-- Trigger the weather data pipeline (fetch, transform, and store weather data)
-- Query weather metrics (average temperature, max wind speed change)
+- Trigger the weather data pipeline (fetch, transform, and store weather data) as a background job and poll its state
+- Query weather metrics (average temperature, max wind speed change, or both in one summary)
 - Check service health
 
 Usage hints:
 - All endpoints are versioned under /v1/
-- Requires environment variables: NWS_API_BASE_URL (optional), DATABASE_URL (required)
+- Configuration is read through app.settings: DATABASE_URL (required), NWS_API_BASE_URL (optional)
 - Returns granular error codes (400, 404, 503, 500) and logs to stdout
 - Designed for integration with Airflow, Docker, and CI/CD
 """
 import contextlib
-import io
 import logging
-import os
-from dotenv import load_dotenv
-from typing import Any, Dict, List, Optional, Union
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, TypedDict, Union
 
-from app.db import get_connection
-from fastapi import FastAPI, HTTPException, Body
+from anyio import to_thread
+from cachetools import TTLCache
+from app.db import close_pools, get_connection, open_pool
+from app.settings import Settings, get_settings
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Body, Depends, Response
 from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
 import httpx
+import msgspec
+import orjson
 from app.metrics import (
     get_average_temperature_last_week,
     get_max_wind_speed_change_last_7_days,
+    get_weekly_summary,
 )
-from psycopg import OperationalError
+from psycopg import Connection, OperationalError
 from pydantic import BaseModel
 
-NWS_API_BASE_URL = os.environ.get("NWS_API_BASE_URL", "https://api.weather.gov")
-DATABASE_URL = os.environ.get("DATABASE_URL", "")
-NWS_USER_AGENT = os.environ.get("NWS_USER_AGENT", "myweatherapp.com, contact@myweatherapp.com")
-
-# Load environment variables from app/.env if it exists, otherwise from .env in the project root
-app_env_path = os.path.join(os.path.dirname(__file__), ".env")
-root_env_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".env"))
-if os.path.exists(app_env_path):
-    load_dotenv(app_env_path)
-else:
-    load_dotenv(root_env_path)
-
 # Configure logging
 logging.basicConfig(level=logging.INFO)
+# Pipeline progress is logged at INFO; keep it even when the root logger was configured elsewhere
+logging.getLogger("app").setLevel(logging.INFO)
 logger = logging.getLogger(__name__)
 
 api_v1 = APIRouter()
 
+# Shared NWS API client: reuses keep-alive connections (and TLS sessions) across calls and pipeline runs.
+# HTTP/2 (httpx[http2]) multiplexes the concurrent station fetches over one connection; servers without it fall back to HTTP/1.1
+NWS_CLIENT = httpx.Client(
+    base_url=get_settings().nws_api_base_url,
+    headers={"User-Agent": get_settings().nws_user_agent},
+    http2=True,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=40, keepalive_expiry=30),
+    timeout=httpx.Timeout(30, connect=5),
+)
+
+
+class NWSValue(TypedDict, total=False):
+    """
+    NWS quantitative value; only the number is decoded (unitCode, qualityControl are skipped).
+    """
+    value: Optional[float]
+
+
+class NWSObservationProperties(TypedDict, total=False):
+    """
+    The observation properties used by transform.flatten_observations.
+    """
+    station: str
+    timestamp: str
+    temperature: Optional[NWSValue]
+    windSpeed: Optional[NWSValue]
+    relativeHumidity: Optional[NWSValue]
+    barometricPressure: Optional[NWSValue]
+    precipitationLastHour: Optional[NWSValue]
+    dewpoint: Optional[NWSValue]
+
+
+class NWSObservation(TypedDict, total=False):
+    properties: NWSObservationProperties
+
+
+class NWSObservationCollection(TypedDict, total=False):
+    features: List[NWSObservation]
+
+
+# Schema-aware decoder for /stations/{id}/observations: builds plain dicts holding only the fields
+# declared above and skips the rest of each feature (geometry, raw METAR, cloud layers, ...) while parsing
+_OBSERVATIONS_DECODER = msgspec.json.Decoder(NWSObservationCollection)
+
+# NWS station metadata by station ID; names, time zones and coordinates rarely change
+_STATION_METADATA_CACHE: TTLCache = TTLCache(maxsize=256, ttl=24 * 60 * 60)
+_STATION_METADATA_LOCK = threading.Lock()
+
+# Metrics results cached in-process: the underlying data changes at most once per pipeline run (hourly)
+_METRICS_CACHE: TTLCache = TTLCache(maxsize=32, ttl=get_settings().metrics_cache_ttl)
+_METRICS_CACHE_LOCK = threading.Lock()
+# One lock per metric, so concurrent misses compute it once instead of stampeding the database
+_METRICS_LOCKS: Dict[str, threading.Lock] = {}
+
+
+# Seconds a successful health check is reused; failures are never cached
+HEALTH_CHECK_INTERVAL = 5.0
+# time.monotonic() of the last successful health check (None until the first one)
+_health_last_ok: Optional[float] = None
+
+# Pipeline jobs by id; finished jobs stay pollable for a day, and the oldest are dropped beyond maxsize
+_JOBS: TTLCache = TTLCache(maxsize=1024, ttl=24 * 60 * 60)
+_JOBS_LOCK = threading.Lock()
+
+# Identifies the capture (pipeline run) whose log records a ListHandler keeps
+_CAPTURE_ID: ContextVar[Optional[int]] = ContextVar("capture_id", default=None)
+
+
+class ListHandler(logging.Handler):
+    """
+    Logging handler that keeps the formatted records of one pipeline run in memory.
+    Records emitted outside its capture context (e.g. by a concurrent run) are ignored.
+    """
+    def __init__(self) -> None:
+        super().__init__()
+        self.records: List[str] = []
+        self.capture_id: int = id(self)
+        self.setFormatter(logging.Formatter("%(message)s"))
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if _CAPTURE_ID.get() == self.capture_id:
+            self.records.append(self.format(record))
+
+    def getvalue(self) -> str:
+        """
+        Return the captured output, one record per line.
+        """
+        return "\n".join(self.records)
+
+
+@contextlib.contextmanager
+def capture_logs(logger_name: str = "app") -> Iterator[ListHandler]:
+    """
+    Capture the log records of the current context (and contexts copied from it) for the duration of the block.
+
+    Args:
+        logger_name (str): Logger to attach to; records from its children propagate to it
+    Yields:
+        ListHandler: Handler holding the captured records
+    """
+    handler = ListHandler()
+    target = logging.getLogger(logger_name)
+    token = _CAPTURE_ID.set(handler.capture_id)
+    target.addHandler(handler)
+    try:
+        yield handler
+    finally:
+        target.removeHandler(handler)
+        _CAPTURE_ID.reset(token)
+
 
 class RunPipelineRequest(BaseModel):
     station_ids: Optional[Union[str, List[str]]] = None
 
 
-def fetch_observations(station_id: str, start: str, end: str) -> list[dict]:
+def fetch_observations(station_id: str, start: str, end: str) -> List[NWSObservation]:
     """
     Fetch weather observations for a station between start and end datetimes.
 
@@ -62,15 +172,13 @@ def fetch_observations(station_id: str, start: str, end: str) -> list[dict]:
         start (str): ISO8601 start datetime.
         end (str): ISO8601 end datetime.
     Returns:
-        list[dict]: List of observation features (dicts).
+        List[NWSObservation]: List of observation features (dicts with the NWSObservation fields only).
     Raises:
         HTTPException: If the NWS API is unreachable or returns an error.
     """
-    url = f"{NWS_API_BASE_URL}/stations/{station_id}/observations"
     params = {"start": start, "end": end}
-    headers = {"User-Agent": NWS_USER_AGENT}
     try:
-        resp = httpx.get(url, params=params, timeout=30, headers=headers)
+        resp = NWS_CLIENT.get(f"/stations/{station_id}/observations", params=params)
         resp.raise_for_status()
     except httpx.RequestError as e:
         # Network or connection error to the NWS API
@@ -78,41 +186,156 @@ def fetch_observations(station_id: str, start: str, end: str) -> list[dict]:
     except httpx.HTTPStatusError as e:
         # NWS API returned an error status code
         raise HTTPException(status_code=resp.status_code, detail=f"Weather API error: {e}")
-    return resp.json().get("features", [])
+    return _OBSERVATIONS_DECODER.decode(resp.content).get("features", [])
 
 
 def fetch_station_metadata(station_id: str) -> dict:
     """
     Fetch station metadata from the NWS /stations/{stationId} endpoint.
-    Returns a dict with canonical info including timeZone, latitude, and longitude.
+    Returns the station properties dict (updated in place) with canonical info including
+    station_id, name, timeZone, latitude, and longitude, ready for db.upsert_station.
+    Results are cached for a day (station metadata rarely changes); treat the returned dict as read-only.
     """
-    url = f"{NWS_API_BASE_URL}/stations/{station_id}"
-    headers = {"User-Agent": NWS_USER_AGENT}
-    resp = httpx.get(url, timeout=10, headers=headers)
+    with _STATION_METADATA_LOCK:
+        props = _STATION_METADATA_CACHE.get(station_id)
+    if props is not None:
+        return props
+    resp = NWS_CLIENT.get(f"/stations/{station_id}", timeout=10)
     resp.raise_for_status()
     data = resp.json()
     props = data.get("properties", {})
     geometry = data.get("geometry", {})
     coordinates = geometry.get("coordinates", [None, None])
+    props["station_id"] = props.get("stationIdentifier") or station_id
     props["latitude"] = coordinates[1]
     props["longitude"] = coordinates[0]
+    with _STATION_METADATA_LOCK:
+        _STATION_METADATA_CACHE[station_id] = props
     return props
 
 
-@api_v1.post("/run-pipeline")
+def _cached_metric(name: str, query: Callable[[Connection], list[dict]], db_url: str) -> bytes:
+    """
+    Return a metric from the in-process cache, running its query only on a miss.
+    Results are cached already serialized (orjson), so cache hits skip JSON encoding entirely.
+    Cache keys include the current UTC hour, so a result never outlives the hour it was computed in.
+
+    Args:
+        name (str): Metric name (cache key prefix)
+        query (Callable): Metrics function taking a database connection
+        db_url (str): PostgreSQL connection string
+    Returns:
+        bytes: The metric rows as a JSON array
+    Raises:
+        OperationalError: If the database is unreachable (errors are never cached)
+    """
+    key: Tuple[str, str] = (name, datetime.now(timezone.utc).strftime("%Y-%m-%dT%H"))
+    with _METRICS_CACHE_LOCK:
+        result = _METRICS_CACHE.get(key)
+        if result is not None:
+            return result
+        metric_lock = _METRICS_LOCKS.setdefault(name, threading.Lock())
+    with metric_lock:
+        # Another request may have filled the cache while we waited for the lock
+        with _METRICS_CACHE_LOCK:
+            result = _METRICS_CACHE.get(key)
+        if result is None:
+            with get_connection(db_url) as conn:
+                result = orjson.dumps(query(conn))
+            with _METRICS_CACHE_LOCK:
+                _METRICS_CACHE[key] = result
+    return result
+
+
+def _clear_metrics_cache() -> None:
+    """
+    Drop cached metrics, e.g. after the pipeline loaded new observations.
+    """
+    with _METRICS_CACHE_LOCK:
+        _METRICS_CACHE.clear()
+
+
+def _update_job(job_id: str, **fields: Any) -> None:
+    """
+    Update the fields of a pipeline job record (no-op if it expired from the job store).
+    """
+    with _JOBS_LOCK:
+        job = _JOBS.get(job_id)
+        if job is not None:
+            job.update(fields)
+
+
+def _run_pipeline_job(job_id: str, station_ids: List[str], db_url: str) -> None:
+    """
+    Run the weather data pipeline for a queued job and record its outcome and captured log output.
+    Runs after the /run-pipeline response has been sent (FastAPI background task).
+
+    Args:
+        job_id (str): Job identifier returned to the client
+        station_ids (List[str]): NWS station identifiers to process
+        db_url (str): PostgreSQL connection string
+    """
+    _update_job(job_id, state="running")
+    # Capture the pipeline log records for Airflow/CI log visibility
+    with capture_logs() as output:
+        try:
+            from app.pipeline import WeatherPipeline
+            pipeline = WeatherPipeline(station_ids, db_url)
+            outcome = pipeline.run()
+            if outcome["loaded"]:
+                _clear_metrics_cache()
+            if outcome["failed"]:
+                # run() logs per-station errors instead of raising; any failed station fails the job
+                result = {"state": "failed", "error": f"Pipeline failed for station(s): {', '.join(outcome['failed'])}"}
+            else:
+                result = {"state": "succeeded", "status": "Pipeline completed"}
+        except RuntimeError as e:
+            # Special case: no new data is not an error, just a status
+            if str(e) == "No new observations to process.":
+                result = {"state": "succeeded", "status": "No new observations to process."}
+            else:
+                logger.error(f"Pipeline failed: {e}")
+                result = {"state": "failed", "error": str(e)}
+        except OperationalError as e:
+            # Database connection error
+            logger.error(f"Database not reachable: {e}")
+            result = {"state": "failed", "error": f"Database not reachable: {e}"}
+        except httpx.HTTPStatusError as e:
+            # NWS API returned an error status code
+            logger.error(f"Weather API HTTP error: {e}")
+            if e.response.status_code == 404:
+                result = {"state": "failed", "error": "Station not found"}
+            elif e.response.status_code == 503:
+                result = {"state": "failed", "error": "Weather API unavailable"}
+            else:
+                result = {"state": "failed", "error": f"Weather API error: {e}"}
+        except httpx.RequestError as e:
+            # Network or connection error to the NWS API
+            logger.error(f"Weather API not reachable: {e}")
+            result = {"state": "failed", "error": f"Weather API not reachable: {e}"}
+        except Exception as e:
+            # Catch-all for unexpected errors
+            logger.error(f"Pipeline failed: {e}")
+            result = {"state": "failed", "error": f"Pipeline failed: {e}"}
+    _update_job(job_id, output=output.getvalue(), **result)
+
+
+@api_v1.post("/run-pipeline", status_code=202)
 def run_pipeline(
+    background_tasks: BackgroundTasks,
     req: Optional[RunPipelineRequest] = Body(
         None,
         examples={
             "single": {"summary": "Single station", "value": {"station_ids": "KATL"}},
             "multiple": {"summary": "Multiple stations", "value": {"station_ids": ["KATL", "003PG"]}},
         }  # type: ignore[arg-type]
-    )
+    ),
+    settings: Settings = Depends(get_settings),
 ) -> Dict[str, Any]:
     """
-    Trigger the weather data pipeline (fetch, transform, load).
+    Queue a run of the weather data pipeline (fetch, transform, load) and return immediately.
     Accepts a JSON body with a 'station_ids' field (string or list of station IDs).
-    Captures all stdout and returns it in the response for Airflow log visibility.
+    Poll GET /v1/run-pipeline/{job_id} for the outcome and the captured log output.
 
     Request body (optional):
         {
@@ -123,135 +346,147 @@ def run_pipeline(
             "station_ids": ["KATL", "003PG"]  # Multiple stations (list)
         }
     Returns:
-        dict: {"status": ..., "output": ...} on success, or {"error": ..., "output": ...} on failure.
+        dict: {"job_id": ..., "state": "queued"} (202 Accepted)
+    Raises:
+        HTTPException: 400 if no station IDs are given and NWS_STATION_ID is not set.
+    """
+    # Prefer explicit request body, fallback to env var
+    if req and req.station_ids is not None:
+        # If station_ids is provided in the request body, normalize to a list
+        station_ids = [req.station_ids] if isinstance(req.station_ids, str) else req.station_ids
+    else:
+        # If not provided in the request, fallback to the NWS_STATION_ID setting
+        station_ids = settings.station_ids
+    if not station_ids:
+        logger.error("Bad input: no station IDs")
+        raise HTTPException(status_code=400, detail="NWS_STATION_ID environment variable is required.")
+    job_id = uuid.uuid4().hex
+    job = {"job_id": job_id, "state": "queued", "station_ids": station_ids, "output": ""}
+    with _JOBS_LOCK:
+        _JOBS[job_id] = job
+    background_tasks.add_task(_run_pipeline_job, job_id, station_ids, settings.database_url)
+    return dict(job)
+
+
+@api_v1.get("/run-pipeline/{job_id}")
+def pipeline_job_status(job_id: str) -> Dict[str, Any]:
+    """
+    Get the state of a pipeline job queued by POST /v1/run-pipeline.
+
+    Returns:
+        dict: {"job_id", "state", "station_ids", "output"} plus "status" once succeeded or "error" once failed.
+            state is one of "queued", "running", "succeeded", "failed".
+    Raises:
+        HTTPException: 404 if the job is unknown or has expired.
+    """
+    with _JOBS_LOCK:
+        job = _JOBS.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return dict(job)
+
+
+@api_v1.get("/metrics/average-temperature", response_model=List[Dict[str, Any]])
+def average_temperature(settings: Settings = Depends(get_settings)) -> Response:
+    """
+    Get the average temperature for the last week from the database.
+    Results are cached in-process for METRICS_CACHE_TTL seconds (see _cached_metric).
+
+    Returns:
+        Response: JSON array of objects with station_id, average_temperature, first_observation, and last_observation
+    Raises:
+        HTTPException: 503 if the database is unreachable.
     """
-    import json
-    import os as _os
-    output = io.StringIO()
     try:
-        # Prefer explicit request body, fallback to env var
-        station_ids = None
-        if req and req.station_ids is not None:
-            # If station_ids is provided in the request body, normalize to a list
-            if isinstance(req.station_ids, str):
-                station_ids = [req.station_ids]
-            elif isinstance(req.station_ids, list):
-                station_ids = req.station_ids
-            else:
-                # Invalid type for station_ids
-                raise HTTPException(status_code=400, detail="station_ids must be a string or list of strings.")
-        else:
-            # If not provided in the request, fallback to environment variable
-            NWS_STATION_ID = _os.environ.get("NWS_STATION_ID")
-            if not NWS_STATION_ID:
-                raise RuntimeError("NWS_STATION_ID environment variable is required.")
-            try:
-                # Try to parse as JSON array or string
-                station_ids = json.loads(NWS_STATION_ID)
-                if isinstance(station_ids, str):
-                    station_ids = [station_ids]
-                elif not isinstance(station_ids, list):
-                    raise ValueError
-            except Exception:
-                # If parsing fails, treat as a single station string
-                station_ids = [NWS_STATION_ID]
-        # Capture all stdout for Airflow/CI log visibility
-        with contextlib.redirect_stdout(output):
-            from app.pipeline import WeatherPipeline
-            pipeline = WeatherPipeline(station_ids, DATABASE_URL)
-            pipeline.run()
-        return {"status": "Pipeline started", "output": output.getvalue()}
-    except RuntimeError as e:
-        # Special case: no new data is not an error, just a status
-        if str(e) == "No new observations to process.":
-            return {"status": "No new observations to process.", "output": output.getvalue()}
-        logger.error(f"Bad input: {e}")
-        return {"error": str(e), "output": output.getvalue()}
-    except HTTPException as e:
-        # Propagate FastAPI/HTTP errors
-        logger.error(f"HTTPException: {e.detail}")
-        return {"error": str(e), "output": output.getvalue()}
+        result = _cached_metric("average_temperature", get_average_temperature_last_week, settings.database_url)
     except OperationalError as e:
         # Database connection error
-        logger.error(f"Database not reachable: {e}")
-        return {"error": f"Database not reachable: {e}", "output": output.getvalue()}
-    except httpx.HTTPStatusError as e:
-        # NWS API returned an error status code
-        logger.error(f"Weather API HTTP error: {e}")
-        if e.response.status_code == 404:
-            return {"error": "Station not found", "output": output.getvalue()}
-        elif e.response.status_code == 503:
-            return {"error": "Weather API unavailable", "output": output.getvalue()}
-        else:
-            return {"error": f"Weather API error: {e}", "output": output.getvalue()}
-    except httpx.RequestError as e:
-        # Network or connection error to the NWS API
-        logger.error(f"Weather API not reachable: {e}")
-        return {"error": f"Weather API not reachable: {e}", "output": output.getvalue()}
-    except Exception as e:
-        # Catch-all for unexpected errors
-        logger.error(f"Pipeline failed: {e}")
-        return {"error": f"Pipeline failed: {e}", "output": output.getvalue()}
+        raise HTTPException(status_code=503, detail=f"Database not reachable: {e}")
+    # Pre-serialized JSON: returned as-is, without FastAPI's response validation and encoding pass
+    return Response(content=result, media_type="application/json")
 
 
-@api_v1.get("/metrics/average-temperature")
-def average_temperature() -> list[dict]:
+@api_v1.get("/metrics/max-wind-speed-change", response_model=List[Dict[str, Any]])
+def max_wind_speed_change(settings: Settings = Depends(get_settings)) -> Response:
     """
-    Get the average temperature for the last week from the database.
+    Get the maximum wind speed change over the last 7 days from the database.
+    Results are cached in-process for METRICS_CACHE_TTL seconds (see _cached_metric).
 
     Returns:
-        list[dict]: List of dicts with station_id, average_temperature, first_observation, and last_observation
+        Response: JSON array of objects with station_id, max_wind_speed_change, first_observation, and last_observation
     Raises:
         HTTPException: 503 if the database is unreachable.
     """
-    db_url = DATABASE_URL
     try:
-        with get_connection(db_url) as conn:
-            result = get_average_temperature_last_week(conn)
+        result = _cached_metric("max_wind_speed_change", get_max_wind_speed_change_last_7_days, settings.database_url)
     except OperationalError as e:
         # Database connection error
         raise HTTPException(status_code=503, detail=f"Database not reachable: {e}")
-    return result
+    # Pre-serialized JSON: returned as-is, without FastAPI's response validation and encoding pass
+    return Response(content=result, media_type="application/json")
 
 
-@api_v1.get("/metrics/max-wind-speed-change")
-def max_wind_speed_change() -> list[dict]:
+@api_v1.get("/metrics/summary", response_model=List[Dict[str, Any]])
+def metrics_summary(settings: Settings = Depends(get_settings)) -> Response:
     """
-    Get the maximum wind speed change over the last 7 days from the database.
+    Get both weekly metrics per station from a single database query.
+    Intended for dashboards that would otherwise call both metrics endpoints back-to-back.
+    Results are cached in-process for METRICS_CACHE_TTL seconds (see _cached_metric).
 
     Returns:
-        list[dict]: List of dicts with station_id, max_wind_speed_change, first_observation, and last_observation
+        Response: JSON array of objects with station_id, avg_temperature, and max_wind_speed_change
     Raises:
         HTTPException: 503 if the database is unreachable.
     """
-    db_url = DATABASE_URL
     try:
-        with get_connection(db_url) as conn:
-            result = get_max_wind_speed_change_last_7_days(conn)
+        result = _cached_metric("summary", get_weekly_summary, settings.database_url)
     except OperationalError as e:
         # Database connection error
         raise HTTPException(status_code=503, detail=f"Database not reachable: {e}")
-    return result
+    # Pre-serialized JSON: returned as-is, without FastAPI's response validation and encoding pass
+    return Response(content=result, media_type="application/json")
 
 
 @api_v1.get("/health")
-def health() -> Dict[str, str]:
+def health(settings: Settings = Depends(get_settings)) -> Dict[str, str]:
     """
     Health check endpoint. Verifies database connectivity.
+    A successful check is reused for HEALTH_CHECK_INTERVAL seconds, so frequent probes
+    (load balancers, orchestrators) hit the database at most once per interval.
 
     Returns:
         dict: {"status": "ok"} if healthy.
     Raises:
         HTTPException: 503 if the database is unreachable.
     """
+    global _health_last_ok
+    if _health_last_ok is not None and time.monotonic() - _health_last_ok < HEALTH_CHECK_INTERVAL:
+        return {"status": "ok"}
     try:
-        with get_connection(DATABASE_URL) as conn:
+        with get_connection(settings.database_url) as conn:
             conn.cursor().execute("SELECT 1;")
+        _health_last_ok = time.monotonic()
         return {"status": "ok"}
     except Exception:
         # Any error means the DB is not reachable
         raise HTTPException(status_code=503, detail="Database not reachable")
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """
+    Open the shared database connection pool on startup and close it on shutdown,
+    so requests lease pooled connections instead of connecting per request.
+    Also sizes the worker threadpool that runs the blocking endpoints, so a few
+    long pipeline runs cannot starve metrics and health requests.
+    """
+    settings = get_settings()
+    to_thread.current_default_thread_limiter().total_tokens = settings.api_thread_limit
+    if settings.database_url:
+        open_pool(settings.database_url)
+    yield
+    close_pools()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 app.include_router(api_v1, prefix="/v1")
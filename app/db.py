@@ -2,7 +2,7 @@
 Database utilities for the Weather Data Pipeline project.
 
 This module provides functions to:
-- Connect to the PostgreSQL database (psycopg3)
+- Connect to the PostgreSQL database (psycopg3), optionally through a process-wide connection pool
 - Create and manage the normalized schema (stations, weather_observations)
 - Upsert station metadata and weather observation data
 - Query for the latest observation timestamp (for incremental fetch)
@@ -10,17 +10,41 @@ This module provides functions to:
 
 Usage hints:
 - Expects a valid PostgreSQL DATABASE_URL (see .env.example)
+- Long-running processes (the API) call open_pool() once; get_connection() then leases pooled connections
 - All schema changes are managed via create_schema()
 - Upserts use ON CONFLICT for idempotency and incremental loading
-- Designed for use with Polars DataFrames for efficient ETL
+- Designed for use with Polars DataFrames (or LazyFrames) for efficient ETL
 """
 
-from typing import Optional
+import atexit
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set, Union
 
 import polars as pl
 import psycopg
-from psycopg import OperationalError
+from psycopg import OperationalError, errors
 from psycopg import Connection
+from psycopg import sql
+from psycopg.pq import TransactionStatus
+from psycopg_pool import ConnectionPool
+
+# Connection parameters shared by dedicated and pooled connections:
+# - options: session settings (replaces per-connection SET round-trips); TimeZone=UTC makes week/hour
+#   boundaries and server-formatted timestamps (e.g. JSON metrics) UTC regardless of server defaults
+# - prepare_threshold: prepare every statement on first use, so repeated upserts skip parse/plan
+CONNECTION_OPTIONS = "-c search_path=wxinfo -c TimeZone=UTC"
+PREPARE_THRESHOLD = 0
+
+# Seconds a pool lease waits for a connection before raising PoolTimeout (an OperationalError), so requests
+# fail fast with a 503 while the database is down instead of blocking for psycopg_pool's default 30 seconds
+POOL_TIMEOUT = 5.0
+# Process-wide connection pools, keyed by database URL (see open_pool)
+_POOLS: Dict[str, ConnectionPool] = {}
+# Database URLs whose schema was created by this process (see ensure_schema)
+_SCHEMA_READY: Set[str] = set()
+_SCHEMA_LOCK = threading.Lock()
 
 SCHEMA_SQL = """
 CREATE SCHEMA IF NOT EXISTS wxinfo;
@@ -36,20 +60,113 @@ CREATE TABLE IF NOT EXISTS wxinfo.stations (
 CREATE TABLE IF NOT EXISTS wxinfo.weather_observations (
     station_id TEXT NOT NULL REFERENCES wxinfo.stations(station_id),
     observation_timestamp TIMESTAMPTZ NOT NULL,
-    temperature DOUBLE PRECISION,
-    dewpoint DOUBLE PRECISION,
-    wind_speed DOUBLE PRECISION,
-    barometric_pressure DOUBLE PRECISION,
-    relative_humidity DOUBLE PRECISION,
-    precipitation_last_hour DOUBLE PRECISION,
+    -- REAL (4 bytes): NWS values carry far fewer significant digits than float4 holds
+    temperature REAL,
+    dewpoint REAL,
+    wind_speed REAL,
+    barometric_pressure REAL,
+    relative_humidity REAL,
+    precipitation_last_hour REAL,
     PRIMARY KEY (station_id, observation_timestamp)
 );
+
+-- Compact BRIN index for the time-range scans of the metrics queries (rows arrive roughly in time order).
+-- Per-station "latest observation" lookups are served by the primary key, scanned backwards.
+CREATE INDEX IF NOT EXISTS idx_obs_ts_brin ON wxinfo.weather_observations USING BRIN (observation_timestamp);
+
+-- Earlier versions kept the hourly aggregates in a materialized view, recomputed in full after each load
+DO $$
+BEGIN
+    IF EXISTS (SELECT FROM pg_matviews WHERE schemaname = 'wxinfo' AND matviewname = 'hourly_temperature') THEN
+        DROP MATERIALIZED VIEW wxinfo.hourly_temperature;
+    END IF;
+END
+$$;
+
+-- Hourly per-station temperature aggregates for the weekly average metric, updated for the hours touched
+-- by each load (see refresh_metric_aggregates).
+-- Sums and counts (not averages) so any range of whole hours can be re-aggregated exactly.
+CREATE TABLE IF NOT EXISTS wxinfo.hourly_temperature (
+    station_id TEXT NOT NULL,
+    observation_hour TIMESTAMPTZ NOT NULL,
+    temperature_sum DOUBLE PRECISION NOT NULL,
+    temperature_count BIGINT NOT NULL,
+    first_observation TIMESTAMPTZ NOT NULL,
+    last_observation TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (station_id, observation_hour)
+);
+
+-- One-time backfill of an empty rollup from existing observations (the NOT EXISTS check runs once, not per row)
+INSERT INTO wxinfo.hourly_temperature
+SELECT
+    station_id,
+    date_trunc('hour', observation_timestamp),
+    -- Summed in double precision (SUM of REAL accumulates in float4)
+    SUM(temperature::float8),
+    COUNT(temperature),
+    MIN(observation_timestamp),
+    MAX(observation_timestamp)
+FROM wxinfo.weather_observations
+WHERE temperature IS NOT NULL
+  AND NOT EXISTS (SELECT FROM wxinfo.hourly_temperature)
+GROUP BY station_id, date_trunc('hour', observation_timestamp);
+"""
+
+# Observation columns and their PostgreSQL types in the staging table (the types are needed to encode rows
+# for binary COPY). Floats are staged as float8 whatever the target column width (REAL, or DOUBLE PRECISION
+# on databases created before the switch); the merge casts them on insert
+OBSERVATION_COLUMN_TYPES = {
+    "station_id": "text",
+    "observation_timestamp": "timestamptz",
+    "temperature": "float8",
+    "wind_speed": "float8",
+    "barometric_pressure": "float8",
+    "relative_humidity": "float8",
+    "precipitation_last_hour": "float8",
+    "dewpoint": "float8",
+}
+OBSERVATION_COLUMNS = tuple(OBSERVATION_COLUMN_TYPES)
+# Rows converted to Python tuples at a time while streaming binary COPY
+COPY_SLICE_ROWS = 10_000
+
+# Transaction-scoped staging table for binary COPY, declared with the types above
+CREATE_STAGING_OBSERVATIONS_SQL = "CREATE TEMP TABLE _stage_obs ({}) ON COMMIT DROP;".format(
+    ", ".join(f"{col} {col_type}" for col, col_type in OBSERVATION_COLUMN_TYPES.items())
+)
+
+# Upsert into weather_observations; {source} is either the staging table or one row of parameters
+_UPSERT_OBSERVATIONS_TEMPLATE = """
+INSERT INTO wxinfo.weather_observations (
+    station_id, observation_timestamp, temperature, wind_speed, barometric_pressure, relative_humidity, precipitation_last_hour, dewpoint
+)
+{source}
+ON CONFLICT (station_id, observation_timestamp) DO UPDATE SET
+    temperature = EXCLUDED.temperature,
+    wind_speed = EXCLUDED.wind_speed,
+    barometric_pressure = EXCLUDED.barometric_pressure,
+    relative_humidity = EXCLUDED.relative_humidity,
+    precipitation_last_hour = EXCLUDED.precipitation_last_hour,
+    dewpoint = EXCLUDED.dewpoint;
 """
 
+# Merge the staged rows into weather_observations in a single statement
+MERGE_STAGED_OBSERVATIONS_SQL = _UPSERT_OBSERVATIONS_TEMPLATE.format(source="""SELECT
+    station_id, observation_timestamp, temperature, wind_speed, barometric_pressure, relative_humidity, precipitation_last_hour, dewpoint
+FROM _stage_obs""")
+
+# Upsert a single row (fallback path, executed with executemany)
+UPSERT_OBSERVATION_SQL = _UPSERT_OBSERVATIONS_TEMPLATE.format(source="VALUES (%s, %s, %s, %s, %s, %s, %s, %s)")
 
-def get_connection(db_url: str) -> Connection:
+# Transaction-scoped advisory lock per station ID, taken in the order of the (sorted) array
+LOCK_STATIONS_SQL = (
+    "SELECT pg_advisory_xact_lock(hashtextextended(station_id, 0)) FROM unnest(%s::text[]) AS s(station_id)"
+)
+
+
+def connect(db_url: str) -> Connection:
     """
-    Get a psycopg3 connection to the database, and set search_path to wxinfo.
+    Open a new psycopg3 connection to the database, with search_path set to wxinfo.
+    Statements are server-side prepared on first use (see PREPARE_THRESHOLD).
 
     Args:
         db_url (str): PostgreSQL connection string (see .env.example)
@@ -59,10 +176,7 @@ def get_connection(db_url: str) -> Connection:
         OperationalError: If connection fails, with diagnostics for debugging
     """
     try:
-        conn = psycopg.connect(db_url)
-        with conn.cursor() as cur:
-            cur.execute("SET search_path TO wxinfo;")
-        return conn
+        return psycopg.connect(db_url, options=CONNECTION_OPTIONS, prepare_threshold=PREPARE_THRESHOLD)
     except OperationalError as e:
         diag = getattr(e, 'diag', None)
         msg = f"Could not connect to database: {e}"
@@ -72,6 +186,72 @@ def get_connection(db_url: str) -> Connection:
         raise OperationalError(msg) from e
 
 
+def open_pool(db_url: str, min_size: int = 4, max_size: int = 20, timeout: float = POOL_TIMEOUT) -> ConnectionPool:
+    """
+    Open (or return the already open) process-wide connection pool for db_url.
+    Connections are established in the background, so this does not block on the database.
+    Open pools are closed automatically at interpreter exit (or explicitly with close_pools()).
+
+    Args:
+        db_url (str): PostgreSQL connection string
+        min_size (int): Connections kept open by the pool (default: 4)
+        max_size (int): Upper bound on concurrent connections (default: 20)
+        timeout (float): Seconds a lease waits for a connection (default: POOL_TIMEOUT)
+    Returns:
+        ConnectionPool: The open pool
+    """
+    pool = _POOLS.get(db_url)
+    if pool is None:
+        pool = ConnectionPool(
+            db_url,
+            min_size=min_size,
+            max_size=max_size,
+            kwargs={"options": CONNECTION_OPTIONS, "prepare_threshold": PREPARE_THRESHOLD},
+            timeout=timeout,
+            open=False,
+        )
+        pool.open()
+        _POOLS[db_url] = pool
+    return pool
+
+
+def close_pools() -> None:
+    """
+    Close all connection pools opened with open_pool().
+    """
+    while _POOLS:
+        _, pool = _POOLS.popitem()
+        pool.close()
+
+
+# Close pooled connections cleanly at interpreter exit (e.g. after the CLI pipeline run)
+atexit.register(close_pools)
+
+
+@contextmanager
+def get_connection(db_url: str) -> Iterator[Connection]:
+    """
+    Context manager yielding a database connection with search_path set to wxinfo.
+    Leases a connection from the pool when open_pool() was called for db_url,
+    otherwise opens a dedicated connection that is closed on exit.
+    The transaction is committed on success and rolled back on error.
+
+    Args:
+        db_url (str): PostgreSQL connection string (see .env.example)
+    Yields:
+        psycopg.Connection: Active database connection
+    Raises:
+        OperationalError: If connection fails, with diagnostics for debugging
+    """
+    pool = _POOLS.get(db_url)
+    if pool is not None:
+        with pool.connection() as conn:
+            yield conn
+    else:
+        with connect(db_url) as conn:
+            yield conn
+
+
 def check_postgres_service(db_url: str, timeout: int = 5) -> bool:
     """
     Check if the Postgres service is running and the database is reachable.
@@ -96,17 +276,53 @@ def check_postgres_service(db_url: str, timeout: int = 5) -> bool:
 def create_schema(conn: Connection) -> None:
     """
     Create the stations and weather_observations tables if they do not exist.
-    Idempotent: safe to call multiple times.
+    Idempotent: safe to call multiple times. Does not commit: the caller owns the transaction.
+
+    Args:
+        conn (psycopg.Connection): Active database connection
+    """
+    with conn.cursor() as cur:
+        # Without parameters psycopg sends the whole script in one round-trip (simple query protocol);
+        # a multi-statement script cannot be prepared, so opt out of prepare_threshold=0
+        cur.execute(SCHEMA_SQL, prepare=False)
+
+
+def ensure_schema(conn: Connection, db_url: str) -> None:
+    """
+    Create the schema once per process and database: later calls for the same db_url return
+    without touching the database. Safe to call from concurrent threads.
+    Commits the schema creation right away, so the memo never records a schema that a later
+    rollback of the caller's transaction would undo.
+
+    Args:
+        conn (psycopg.Connection): Active database connection to db_url
+        db_url (str): PostgreSQL connection string (memoization key)
+    """
+    if db_url in _SCHEMA_READY:
+        return
+    with _SCHEMA_LOCK:
+        if db_url not in _SCHEMA_READY:
+            create_schema(conn)
+            conn.commit()
+            _SCHEMA_READY.add(db_url)
+
+
+def lock_stations(conn: Connection, station_ids: List[str]) -> None:
+    """
+    Serialize concurrent loads of the same stations (e.g. a scheduled run and a manual POST): blocks until
+    no other transaction holds any of their locks, and holds them until the caller's transaction ends.
+    Call it first in the load transaction, before any station or observation row is written: the locks are
+    taken in sorted order, so two loads of overlapping station sets cannot deadlock. Locks already held by
+    the transaction are taken again without waiting.
 
     Args:
         conn (psycopg.Connection): Active database connection
+        station_ids (List[str]): NWS station identifiers
     """
+    if not station_ids:
+        return
     with conn.cursor() as cur:
-        # Split SCHEMA_SQL on semicolons to execute each statement separately
-        for statement in SCHEMA_SQL.strip().split(';'):
-            if statement.strip():
-                cur.execute(statement)
-    conn.commit()
+        cur.execute(LOCK_STATIONS_SQL, (sorted(set(station_ids)),))
 
 
 def upsert_station(conn: Connection, station_meta: dict) -> None:
@@ -119,66 +335,190 @@ def upsert_station(conn: Connection, station_meta: dict) -> None:
         station_meta (dict): Station metadata (from NWS API observation)
             Required keys: station_id, name, timeZone, latitude, longitude
     """
+    upsert_stations(conn, [station_meta])
+
+
+def upsert_stations(conn: Connection, station_metas: List[dict]) -> None:
+    """
+    Upsert several station records into the stations table with a single statement.
+    Rows are passed as one array per column and expanded server-side with unnest(), so the
+    statement text (and its prepared plan) is the same for any number of stations.
+    Does not commit: the caller owns the transaction.
+
+    Args:
+        conn (psycopg.Connection): Active database connection
+        station_metas (List[dict]): Station metadata dicts, with the keys of upsert_station
+            If a station appears more than once, the last entry wins
+    """
+    # ON CONFLICT cannot update the same row twice in one statement: keep one entry per station
+    by_station = {meta.get("station_id"): meta for meta in station_metas}
+    if not by_station:
+        return
+    metas = list(by_station.values())
+    # psycopg cannot dump a list mixing int and float (NWS sends whole-degree coordinates as integers)
+    latitudes = [None if meta.get("latitude") is None else float(meta["latitude"]) for meta in metas]
+    longitudes = [None if meta.get("longitude") is None else float(meta["longitude"]) for meta in metas]
     with conn.cursor() as cur:
         cur.execute(
             """
             INSERT INTO wxinfo.stations (station_id, station_name, station_timezone, latitude, longitude)
-            VALUES (%s, %s, %s, %s, %s)
+            SELECT * FROM unnest(%s::text[], %s::text[], %s::text[], %s::float8[], %s::float8[])
             ON CONFLICT (station_id) DO UPDATE SET
                 station_name = EXCLUDED.station_name,
                 station_timezone = EXCLUDED.station_timezone,
                 latitude = EXCLUDED.latitude,
-                longitude = EXCLUDED.longitude;
+                longitude = EXCLUDED.longitude
+            -- Unchanged stations (the usual case) are left alone instead of rewritten as new row versions
+            WHERE (stations.station_name, stations.station_timezone, stations.latitude, stations.longitude)
+                IS DISTINCT FROM (EXCLUDED.station_name, EXCLUDED.station_timezone, EXCLUDED.latitude, EXCLUDED.longitude);
             """,
             (
-                station_meta.get("station_id"),
-                station_meta.get("name"),
-                station_meta.get("timeZone"),
-                station_meta.get("latitude"),
-                station_meta.get("longitude"),
+                [meta.get("station_id") for meta in metas],
+                [meta.get("name") for meta in metas],
+                [meta.get("timeZone") for meta in metas],
+                latitudes,
+                longitudes,
             )
         )
-    conn.commit()
 
 
-def upsert_weather_data(conn: Connection, df: pl.DataFrame) -> int:
+def upsert_weather_data(conn: Connection, df: Union[pl.DataFrame, pl.LazyFrame]) -> int:
     """
     Upsert weather data from a Polars DataFrame into the weather_observations table.
-    Uses ON CONFLICT for idempotency and incremental loading.
+    Rows are streamed with binary COPY into a temporary staging table and merged with a single
+    INSERT ... SELECT ... ON CONFLICT, so the load costs one round-trip regardless of row count.
+    Binary COPY sends floats and timestamps in their native encoding (no text formatting or server-side parsing).
+    If the database role may not create temporary tables, rows are upserted with a pipelined
+    executemany instead (still no per-row round-trip wait).
+    A LazyFrame is collected with the streaming engine, fused with the column casts, so only the
+    staged columns are ever materialized. Rows repeating a (station_id, observation_timestamp) key are
+    collapsed to the last one before loading.
+    Does not commit: the caller owns the transaction (on a connection with no open transaction, the
+    statements open the implicit one, which is left open for the caller to commit or roll back).
 
     Args:
         conn (psycopg.Connection): Active database connection
-        df (pl.DataFrame): DataFrame with columns: station_id, observation_timestamp, temperature, wind_speed, barometric_pressure, relative_humidity, precipitation_last_hour, dewpoint
+        df (pl.DataFrame | pl.LazyFrame): Frame with columns: station_id, observation_timestamp, temperature, wind_speed, barometric_pressure, relative_humidity, precipitation_last_hour, dewpoint
+            observation_timestamp may be ISO 8601 strings or timezone-aware datetimes
     Returns:
-        int: Number of rows upserted
+        int: Number of rows upserted (after collapsing duplicate keys)
     """
-    if df.is_empty():
+    if isinstance(df, pl.DataFrame) and df.is_empty():
+        return 0
+    schema = df.schema
+    # Values of the declared column types, in OBSERVATION_COLUMNS order: parse timestamps,
+    # widen ints/all-null columns to float, and load missing observation columns as NULL
+    exprs = []
+    for col in OBSERVATION_COLUMNS:
+        if col not in schema:
+            exprs.append(pl.lit(None, dtype=pl.Float64).alias(col))
+        elif OBSERVATION_COLUMN_TYPES[col] == "float8":
+            exprs.append(pl.col(col).cast(pl.Float64))
+        elif col == "observation_timestamp" and schema[col] == pl.Utf8:
+            exprs.append(pl.col(col).str.to_datetime("%+", time_unit="us", time_zone="UTC"))
+        else:
+            exprs.append(pl.col(col))
+    # Duplicate keys within one batch would make the merge fail (ON CONFLICT cannot touch a row twice): keep the last
+    staged = (
+        df.lazy()
+        .select(exprs)
+        .unique(subset=["station_id", "observation_timestamp"], keep="last", maintain_order=True)
+        .collect(streaming=True)
+    )
+    if staged.is_empty():
         return 0
-    records = df.to_dicts()
+    copy_sql = sql.SQL("COPY _stage_obs ({}) FROM STDIN WITH (FORMAT BINARY)").format(
+        sql.SQL(", ").join(map(sql.Identifier, OBSERVATION_COLUMNS))
+    )
+    # Savepoint inside the caller's open transaction, so a failed staging attempt leaves it usable. Outside one,
+    # conn.transaction() would open and commit a top-level transaction: run in the implicit transaction instead
+    in_transaction = conn.info.transaction_status == TransactionStatus.INTRANS
+
+    def savepoint():
+        return conn.transaction() if in_transaction else nullcontext()
     with conn.cursor() as cur:
-        for rec in records:
-            cur.execute(
-                """
-                INSERT INTO wxinfo.weather_observations (
-                    station_id, observation_timestamp, temperature, wind_speed, barometric_pressure, relative_humidity, precipitation_last_hour, dewpoint
-                ) VALUES (
-                    %(station_id)s, %(observation_timestamp)s, %(temperature)s, %(wind_speed)s, %(barometric_pressure)s, %(relative_humidity)s, %(precipitation_last_hour)s, %(dewpoint)s
-                )
-                ON CONFLICT (station_id, observation_timestamp) DO UPDATE SET
-                    temperature = EXCLUDED.temperature,
-                    wind_speed = EXCLUDED.wind_speed,
-                    barometric_pressure = EXCLUDED.barometric_pressure,
-                    relative_humidity = EXCLUDED.relative_humidity,
-                    precipitation_last_hour = EXCLUDED.precipitation_last_hour,
-                    dewpoint = EXCLUDED.dewpoint;
-                """,
-                rec
-            )
-    conn.commit()
-    return len(records)
+        try:
+            with savepoint():
+                # Staging table is dropped right after the merge (same round-trip), so several loads can share
+                # one transaction; ON COMMIT DROP still cleans up if the merge never runs
+                cur.execute(CREATE_STAGING_OBSERVATIONS_SQL)
+                with cur.copy(copy_sql) as copy:
+                    copy.set_types(list(OBSERVATION_COLUMN_TYPES.values()))
+                    # One open COPY stream; rows are built as tuples one zero-copy slice at a time
+                    for batch in staged.iter_slices(n_rows=COPY_SLICE_ROWS):
+                        for row in batch.iter_rows():
+                            copy.write_row(row)
+                cur.execute(MERGE_STAGED_OBSERVATIONS_SQL + "DROP TABLE _stage_obs;", prepare=False)
+        except errors.InsufficientPrivilege:
+            if not in_transaction:
+                # The failed implicit transaction holds nothing but the staging attempt
+                conn.rollback()
+            # No TEMP privilege on this database: pipeline mode sends all rows without waiting per row
+            with savepoint(), conn.pipeline():
+                cur.executemany(UPSERT_OBSERVATION_SQL, staged.iter_rows())
+    return staged.height
+
+
+def refresh_metric_aggregates(conn: Connection, since: Dict[str, datetime]) -> None:
+    """
+    Update the pre-aggregated metrics tables (wxinfo.hourly_temperature) after new observations were loaded.
+    Only the hours from each station's load window onwards are re-aggregated (from the stored observations,
+    so re-loaded or corrected values replace the old aggregates); older hours are left untouched.
+    Run it in the same transaction as the load, so readers never see observations without their aggregates,
+    after lock_stations for the same stations.
+
+    Does not commit: the caller owns the transaction.
+
+    Args:
+        conn (psycopg.Connection): Active database connection
+        since (Dict[str, datetime]): Earliest loaded observation time (or window start) per station
+    """
+    if not since:
+        return
+    params = (list(since), list(since.values()))
+    # Pipeline mode: all statements are sent together and their results read back in one round-trip
+    with conn.pipeline(), conn.cursor() as cur:
+        # Same locks as lock_stations (no wait if the load already holds them): concurrent refreshes of a station
+        # must not clear and re-insert the same hours at once
+        cur.execute(LOCK_STATIONS_SQL, (sorted(since),))
+        # Clear the affected hours first: an hour whose temperatures all became NULL has no group to upsert
+        cur.execute(
+            """
+            DELETE FROM wxinfo.hourly_temperature h
+            USING unnest(%s::text[], %s::timestamptz[]) AS s(station_id, since)
+            WHERE h.station_id = s.station_id
+              AND h.observation_hour >= date_trunc('hour', s.since)
+            """,
+            params,
+        )
+        cur.execute(
+            """
+            INSERT INTO wxinfo.hourly_temperature
+            SELECT
+              o.station_id,
+              date_trunc('hour', o.observation_timestamp),
+              SUM(o.temperature::float8),
+              COUNT(o.temperature),
+              MIN(o.observation_timestamp),
+              MAX(o.observation_timestamp)
+            FROM unnest(%s::text[], %s::timestamptz[]) AS s(station_id, since)
+            JOIN wxinfo.weather_observations o
+              ON o.station_id = s.station_id
+             AND o.observation_timestamp >= date_trunc('hour', s.since)
+            WHERE o.temperature IS NOT NULL
+            GROUP BY o.station_id, date_trunc('hour', o.observation_timestamp)
+            -- Defensive: a row committed by a writer that did not take the lock (e.g. the schema backfill)
+            ON CONFLICT (station_id, observation_hour) DO UPDATE SET
+              temperature_sum = EXCLUDED.temperature_sum,
+              temperature_count = EXCLUDED.temperature_count,
+              first_observation = EXCLUDED.first_observation,
+              last_observation = EXCLUDED.last_observation
+            """,
+            params,
+        )
 
 
-def get_latest_observation_timestamp(conn: Connection, station_id: str) -> Optional[str]:
+def get_latest_observation_timestamp(conn: Connection, station_id: str) -> Optional[datetime]:
     """
     Return the latest observation timestamp for the given station_id, or None if no data exists.
     Used for incremental fetch (only fetch new data after this timestamp).
@@ -187,17 +527,52 @@ def get_latest_observation_timestamp(conn: Connection, station_id: str) -> Optio
         conn (psycopg.Connection): Active database connection
         station_id (str): The station identifier
     Returns:
-        str | None: ISO8601 timestamp string, or None if no data
+        datetime | None: Timezone-aware timestamp, or None if no data
     """
     with conn.cursor() as cur:
         cur.execute(
             """
-            SELECT MAX(observation_timestamp)
+            SELECT observation_timestamp
             FROM wxinfo.weather_observations
             WHERE station_id = %s
+            ORDER BY observation_timestamp DESC
+            LIMIT 1
             """,
             (station_id,)
         )
         result = cur.fetchone()
-        # result[0] is a datetime or None
-        return result[0].isoformat() if result and result[0] else None
+        # result is None when the station has no data, otherwise result[0] is a datetime
+        return result[0] if result else None
+
+
+def get_latest_observation_timestamps(conn: Connection, station_ids: List[str]) -> Dict[str, Optional[datetime]]:
+    """
+    Get the latest observation timestamp of several stations in a single round-trip.
+    Each station is resolved with the same primary-key backward scan as get_latest_observation_timestamp.
+
+    Args:
+        conn (psycopg.Connection): Active database connection
+        station_ids (List[str]): Station identifiers
+    Returns:
+        Dict[str, Optional[datetime]]: Station ID -> latest observation timestamp (timezone-aware), or None if the station has no data
+    """
+    latest: Dict[str, Optional[datetime]] = {station_id: None for station_id in station_ids}
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT s.station_id, o.observation_timestamp
+            FROM unnest(%s::text[]) AS s(station_id)
+            CROSS JOIN LATERAL (
+                SELECT observation_timestamp
+                FROM wxinfo.weather_observations
+                WHERE station_id = s.station_id
+                ORDER BY observation_timestamp DESC
+                LIMIT 1
+            ) AS o
+            """,
+            (list(station_ids),)
+        )
+        # Stations without data produce no row and keep their None default
+        for station_id, ts in cur.fetchall():
+            latest[station_id] = ts
+    return latest
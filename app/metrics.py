@@ -4,11 +4,36 @@ Metrics module for the Weather Data Pipeline project.
 Provides SQL-based analytics functions for:
 - Average observed temperature for the last full week (Mon-Sun)
 - Maximum wind speed change in the last 7 days (rolling window)
+- A per-station summary of both metrics computed in a single query
+
+The temperature metric reads the hourly pre-aggregates in wxinfo.hourly_temperature (updated by the
+pipeline with each load); the wind speed metric needs consecutive raw observations and reads weather_observations.
 
 Each function expects an open database connection and returns query results for analytics endpoints.
+Rows are shaped into JSON objects by PostgreSQL (json_agg), so no per-row Python conversion is needed.
 """
 
+import orjson
 from psycopg import Connection
+from psycopg.types.json import set_json_loads
+
+
+def _fetch_json_rows(conn: Connection, query: str) -> list[dict]:
+    """
+    Run a SELECT and return its rows as dicts keyed by column name, built server-side by json_agg.
+    The single JSON value is parsed with orjson, scoped to this cursor.
+
+    Args:
+        conn (Connection): psycopg database connection
+        query (str): SELECT statement (no trailing semicolon); its column names become the dict keys
+    Returns:
+        List[dict]: One dict per row (timestamps as ISO 8601 strings in UTC)
+    """
+    with conn.cursor() as cur:
+        set_json_loads(orjson.loads, cur)
+        cur.execute(f"SELECT COALESCE(json_agg(q), '[]'::json) FROM ({query}) AS q")
+        row = cur.fetchone()
+        return row[0] if row else []
 
 
 def get_average_temperature_last_week(conn: Connection) -> list[dict]:
@@ -21,42 +46,24 @@ def get_average_temperature_last_week(conn: Connection) -> list[dict]:
         List[dict]: List of dicts with station_id, avg_temperature, first and last observation timestamps for the week
     """
     sql = """
-    WITH filtered AS (
-      SELECT
-        station_id,
-        temperature,
-        observation_timestamp
-      FROM wxinfo.weather_observations
-      WHERE observation_timestamp >= date_trunc('week', now()) - interval '7 days'
-        AND observation_timestamp < date_trunc('week', now())
-        AND temperature IS NOT NULL
-    )
     SELECT
       station_id,
-      ROUND(AVG(temperature)::numeric, 2) AS avg_temperature,
-      MIN(observation_timestamp) AS first_observation,
-      MAX(observation_timestamp) AS last_observation
-    FROM filtered
-    GROUP BY station_id;
+      ROUND((SUM(temperature_sum) / SUM(temperature_count))::numeric, 2) AS avg_temperature,
+      MIN(first_observation) AS first_observation,
+      MAX(last_observation) AS last_observation
+    FROM wxinfo.hourly_temperature
+    WHERE observation_hour >= date_trunc('week', now()) - interval '7 days'
+      AND observation_hour < date_trunc('week', now())
+    GROUP BY station_id
     """
     # The query computes the average temperature for each station for the last *full* week (Mon-Sun)
     # and also returns the first and last observation timestamps considered for the week.
     # date_trunc('week', now()) gives the start of the current week (Monday 00:00:00).
     # Subtracting 7 days gives the start of the previous week.
-    # The WHERE clause selects all records from last week's Monday (inclusive) up to this week's Monday (exclusive
-    with conn.cursor() as cur:
-        cur.execute(sql)
-        rows = cur.fetchall()
-        # Map to list of dicts for API response
-        return [
-            {
-                "station_id": row[0],
-                "avg_temperature": float(row[1]) if row[1] is not None else None,
-                "first_observation": row[2].isoformat() if row[2] else None,
-                "last_observation": row[3].isoformat() if row[3] else None,
-            }
-            for row in rows
-        ]
+    # The WHERE clause selects the hours from last week's Monday (inclusive) up to this week's Monday (exclusive).
+    # It reads the hourly pre-aggregates (~168 rows per station) instead of the raw observations: week boundaries
+    # fall on whole hours, so summing the hourly sums and counts gives exactly the average of the raw values.
+    return _fetch_json_rows(conn, sql)
 
 
 def get_max_wind_speed_change_last_7_days(conn: Connection) -> list[dict]:
@@ -88,35 +95,69 @@ def get_max_wind_speed_change_last_7_days(conn: Connection) -> list[dict]:
         observation_timestamp
       FROM lagged
       WHERE prev_wind_speed IS NOT NULL
-    ),
-    ranked AS (
-      SELECT
-        *,
-        ROW_NUMBER() OVER (PARTITION BY station_id ORDER BY wind_speed_change DESC NULLS LAST) AS rn
-      FROM diffs
     )
-    SELECT
+    SELECT DISTINCT ON (station_id)
       station_id,
       ROUND(wind_speed_change::numeric, 2) AS max_wind_speed_change,
       prev_observation_timestamp AS first_observation,
       observation_timestamp AS last_observation
-    FROM ranked
-    WHERE rn = 1;
+    FROM diffs
+    ORDER BY station_id, wind_speed_change DESC NULLS LAST
     """
     # Query steps (complex because we want the maximum difference per station, along with the timestamps of the two consecutive observations involved):
     # 1. lagged: For each observation, get the previous wind_speed and timestamp for the same station (using LAG window function).
     # 2. diffs: Compute the absolute difference between each wind_speed and its previous value, keeping the relevant timestamps.
-    # 3. ranked: Rank the differences per station, so the largest difference per station is ranked first.
-    # 4. Final SELECT: For each station, return the row with the maximum wind speed change and the timestamps of the two consecutive observations involved.
-    with conn.cursor() as cur:
-        cur.execute(sql)
-        rows = cur.fetchall()
-        return [
-            {
-                "station_id": row[0],
-                "max_wind_speed_change": float(row[1]) if row[1] is not None else None,
-                "first_observation": row[2].isoformat() if row[2] else None,
-                "last_observation": row[3].isoformat() if row[3] else None,
-            }
-            for row in rows
-        ]
+    # 3. Final SELECT: DISTINCT ON keeps the first row per station in ORDER BY order, i.e. the row with the maximum
+    #    wind speed change and the timestamps of the two consecutive observations involved (no ranking pass needed).
+    return _fetch_json_rows(conn, sql)
+
+
+def get_weekly_summary(conn: Connection) -> list[dict]:
+    """
+    Compute both weekly metrics per station in a single query (one round-trip):
+    the average temperature for the last full week (Mon-Sun) and the maximum wind speed
+    change between consecutive observations in the last 7 days (rolling window).
+
+    Args:
+        conn (Connection): psycopg database connection
+    Returns:
+        List[dict]: List of dicts with station_id, avg_temperature, and max_wind_speed_change
+    """
+    sql = """
+    WITH weekly_temperature AS (
+      SELECT
+        station_id,
+        ROUND((SUM(temperature_sum) / SUM(temperature_count))::numeric, 2) AS avg_temperature
+      FROM wxinfo.hourly_temperature
+      WHERE observation_hour >= date_trunc('week', now()) - interval '7 days'
+        AND observation_hour < date_trunc('week', now())
+      GROUP BY station_id
+    ),
+    lagged AS (
+      SELECT
+        station_id,
+        wind_speed,
+        LAG(wind_speed) OVER (PARTITION BY station_id ORDER BY observation_timestamp) AS prev_wind_speed
+      FROM wxinfo.weather_observations
+      WHERE observation_timestamp >= now() - interval '7 days'
+        AND wind_speed IS NOT NULL
+    ),
+    wind_speed_changes AS (
+      SELECT
+        station_id,
+        ROUND(MAX(ABS(wind_speed - prev_wind_speed))::numeric, 2) AS max_wind_speed_change
+      FROM lagged
+      WHERE prev_wind_speed IS NOT NULL
+      GROUP BY station_id
+    )
+    SELECT
+      station_id,
+      t.avg_temperature,
+      w.max_wind_speed_change
+    FROM weekly_temperature t
+    FULL OUTER JOIN wind_speed_changes w USING (station_id)
+    ORDER BY station_id
+    """
+    # The two CTE branches are the same queries as the individual metrics above (temperature from the hourly aggregates); the FULL OUTER JOIN
+    # keeps stations that only have data for one of the two windows (the other metric is then None).
+    return _fetch_json_rows(conn, sql)
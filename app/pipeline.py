@@ -6,137 +6,266 @@ This module provides the ETL pipeline logic to:
 - Transform and normalize the data for analytics
 - Upsert station metadata and weather observations into a normalized Postgres schema
 - Support incremental loading (fetch only new data since last observation)
+- Fetch multiple stations concurrently and load them in a single batch
 
 Usage hints:
 - Expects environment variables: NWS_STATION_ID, DATABASE_URL (see .env.example)
 - Designed for use as a CLI entrypoint or via FastAPI/Airflow
-- All print output is captured by the API for Airflow log visibility
+- All log output (logger 'app.pipeline') is captured by the API for Airflow log visibility
 - Handles missing data, incremental fetch, and robust error reporting
+- Stations with data newer than PIPELINE_MIN_INTERVAL seconds are skipped without calling the NWS API
 """
-import os
-
 from app import api, db, transform
-from dotenv import load_dotenv
-from typing import List
+from app.settings import get_settings
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException
+from typing import Dict, List, Optional, Tuple, TypedDict
+import httpx
+import logging
+import polars as pl
+import time
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on concurrent NWS requests per pipeline run (keeps us polite to api.weather.gov)
+MAX_FETCH_WORKERS = 10
+# Retry rounds for stations whose fetch failed with a transient error (network, rate limiting, server errors)
+FETCH_RETRIES = 2
+# Seconds to wait before the first retry round; doubled for each further round
+FETCH_RETRY_BACKOFF = 1.0
+
+
+class PipelineResult(TypedDict):
+    """
+    Outcome of WeatherPipeline.run: stations whose observations were committed and stations that failed.
+    Stations that were skipped or had no new observations appear in neither list.
+    """
+    loaded: List[str]
+    failed: List[str]
+
+
+def _is_transient(exc: Exception) -> bool:
+    """
+    Whether a failed NWS fetch is worth retrying: network errors, HTTP 429 and 5xx responses.
+
+    Args:
+        exc (Exception): Error raised while fetching a station
+    Returns:
+        bool: True if the same request may succeed later
+    """
+    if isinstance(exc, httpx.TransportError):
+        return True
+    if isinstance(exc, HTTPException):
+        status = exc.status_code
+    elif isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+    else:
+        return False
+    return status == 429 or status >= 500
 
 
 class WeatherPipeline:
     """
     Pipeline to fetch, transform, and store weather data for one or more stations.
     """
-    def __init__(self, station_ids: List[str], db_url: str) -> None:
+    def __init__(
+        self,
+        station_ids: List[str],
+        db_url: str,
+        max_workers: int = MAX_FETCH_WORKERS,
+        min_interval: Optional[float] = None,
+        end: Optional[datetime] = None,
+    ) -> None:
         """
         Initialize pipeline with station IDs and database URL.
 
         Args:
             station_ids (List[str]): List of NWS station identifiers
             db_url (str): PostgreSQL connection string
+            max_workers (int): Maximum number of stations fetched from the NWS API concurrently
+            min_interval (Optional[float]): Seconds; stations whose latest stored observation is newer are skipped
+                (defaults to the PIPELINE_MIN_INTERVAL setting, 0 disables)
+            end (Optional[datetime]): Timezone-aware "as of" time closing every station's fetch window
+                (defaults to the time run() starts)
         """
         self.station_ids: List[str] = station_ids
         self.db_url: str = db_url
+        self.max_workers: int = max_workers
+        if min_interval is None:
+            min_interval = get_settings().pipeline_min_interval
+        self.min_interval: timedelta = timedelta(seconds=min_interval)
+        self.end: Optional[datetime] = end
 
-    def run(self) -> None:
+    def _fetch_window(self, station_id: str, start: datetime, end: datetime) -> Optional[Tuple[dict, pl.DataFrame]]:
+        """
+        Fetch and transform one station's observations for the given time window.
+        Runs on a worker thread; does not touch the database.
+
+        Args:
+            station_id (str): NWS station identifier
+            start (datetime): Start of the time window (inclusive)
+            end (datetime): End of the time window
+        Returns:
+            Optional[Tuple[dict, pl.DataFrame]]: (station metadata, observations) or None if there is nothing to load
+        """
+        try:
+            # Fetch observations from the NWS API for the given time window
+            observations = api.fetch_observations(
+                station_id,
+                start=start.isoformat(),
+                end=end.isoformat(),
+            )
+        except Exception as e:
+            # If the API call fails, log and raise the error
+            logger.error(f"Error fetching observations: {e}")
+            raise
+        if not observations:
+            # No new data to process for this station
+            logger.info(f"No new observations to process for station {station_id}.")
+            return None
+        # Fetch canonical station metadata from the NWS stations endpoint (already shaped for upsert_station)
+        station_meta = api.fetch_station_metadata(station_id)
+        # Transform observations to Polars DataFrame for efficient upsert
+        df = transform.flatten_observations(observations)
+        if df.is_empty():
+            # Defensive: no valid data after transformation
+            logger.info(f"No new observations to process for station {station_id}.")
+            return None
+        return station_meta, df
+
+    def run(self) -> PipelineResult:
         """
         Run the pipeline: fetch, transform, and upsert weather data for all stations.
-        Handles incremental fetch and robust error reporting.
-        Prints all output for Airflow log capture.
+        Handles incremental fetch and robust error reporting: errors are logged per station and reported
+        in the result instead of raised, so one failing station does not stop the others.
+        Logs all output for Airflow log capture.
+
+        Runs in three phases so the NWS round-trips overlap instead of running back-to-back:
+        1. One database connection: ensure the schema (once per process) and compute each station's fetch window (one lookup query)
+        2. Worker threads (up to max_workers): fetch and transform every station concurrently; stations failing with
+           a transient NWS error are retried together, up to FETCH_RETRIES rounds with exponential backoff
+        3. One database connection and transaction: upsert all station metadata in one statement, load all observations
+           in a single COPY and update the metrics pre-aggregates for the loaded windows
+
+        Returns:
+            PipelineResult: Loaded and failed station IDs
         """
-        from datetime import datetime, timedelta, timezone
-        for station_id in self.station_ids:
-            print(f"Starting pipeline for station {station_id}")
-            try:
-                with db.get_connection(self.db_url) as conn:
-                    db.create_schema(conn)
-                    # Determine the time range for incremental fetch
-                    latest_ts = db.get_latest_observation_timestamp(conn, station_id)
-                    end = datetime.now(timezone.utc)
+        # Phase 1: determine the time range for incremental fetch of each station
+        windows: Dict[str, Tuple[datetime, datetime]] = {}
+        try:
+            with db.get_connection(self.db_url) as conn:
+                # Created on the first run of the process only
+                db.ensure_schema(conn, self.db_url)
+                # One "as of" time for all stations, so their windows are consistent
+                end = self.end or datetime.now(timezone.utc)
+                # One query for every station's latest observation
+                latest = db.get_latest_observation_timestamps(conn, self.station_ids)
+                for station_id in self.station_ids:
+                    logger.info(f"Starting pipeline for station {station_id}")
+                    latest_ts = latest.get(station_id)
                     if latest_ts is None:
                         # First run: fetch last 7 days for this station
                         start = end - timedelta(days=7)
-                        print("No previous data found. Fetching last 7 days.")
+                        logger.info("No previous data found. Fetching last 7 days.")
+                    elif end - latest_ts < self.min_interval:
+                        # Fresh enough: skip the NWS round-trips on tight schedules
+                        logger.info(f"Latest observation in DB: {latest_ts.isoformat()}. Data is fresh, skipping station {station_id}.")
+                        continue
                     else:
                         # Incremental: fetch only new data since last observation
-                        start = datetime.fromisoformat(latest_ts)
-                        print(f"Latest observation in DB: {latest_ts}. Fetching new data since then.")
+                        logger.info(f"Latest observation in DB: {latest_ts.isoformat()}. Fetching new data since then.")
                         # Add 1 second to start to avoid duplicate fetch of the last record
-                        start = start + timedelta(seconds=1)
+                        start = latest_ts + timedelta(seconds=1)
+                    windows[station_id] = (start, end)
+        except Exception as e:
+            # Without a working database no station can be processed
+            for station_id in self.station_ids:
+                logger.error(f"Error processing station {station_id}: {e}")
+            return {"loaded": [], "failed": list(self.station_ids)}
+
+        # Phase 2: fetch and transform all stations concurrently
+        loaded: Dict[str, Tuple[dict, pl.DataFrame]] = {}
+        failed: List[str] = []
+        pending = windows
+        workers = max(1, min(self.max_workers, len(windows)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for attempt in range(FETCH_RETRIES + 1):
+                if attempt:
+                    # Exponential backoff, then retry only the stations that failed transiently (all in one round)
+                    time.sleep(FETCH_RETRY_BACKOFF * 2 ** (attempt - 1))
+                futures = {
+                    # Run each fetch in a copy of the caller's context, so API log capture sees worker records
+                    station_id: executor.submit(copy_context().run, self._fetch_window, station_id, start, end)
+                    for station_id, (start, end) in pending.items()
+                }
+                retry: Dict[str, Tuple[datetime, datetime]] = {}
+                for station_id, future in futures.items():
                     try:
-                        # Fetch observations from the NWS API for the given time window
-                        observations = api.fetch_observations(
-                            station_id,
-                            start=start.isoformat(),
-                            end=end.isoformat(),
-                        )
+                        result = future.result()
                     except Exception as e:
-                        # If the API call fails, log and raise the error
-                        print(f"Error fetching observations: {e}")
-                        raise
-                    if not observations:
-                        # No new data to process for this station
-                        print(f"No new observations to process for station {station_id}.")
-                        continue  # Move to next station
-                    # Fetch canonical station metadata from the NWS stations endpoint
-                    station_props = api.fetch_station_metadata(station_id)
-                    station_meta = {
-                        "station_id": station_props.get("stationIdentifier") or station_id,
-                        "name": station_props.get("name"),
-                        "timeZone": station_props.get("timeZone"),
-                        "latitude": station_props.get("latitude"),
-                        "longitude": station_props.get("longitude")
-                    }
-                    # Upsert station metadata to ensure referential integrity
-                    db.upsert_station(conn, station_meta)
-                    # Transform observations to Polars DataFrame for efficient upsert
-                    df = transform.flatten_observations(observations)
-                    if df.is_empty():
-                        # Defensive: no valid data after transformation
-                        print(f"No new observations to process for station {station_id}.")
+                        if attempt < FETCH_RETRIES and _is_transient(e):
+                            logger.warning(f"Retrying station {station_id} after error: {e}")
+                            retry[station_id] = pending[station_id]
+                            continue
+                        # Log and continue with the other stations on error
+                        logger.error(f"Error processing station {station_id}: {e}")
+                        failed.append(station_id)
                         continue
-                    # Upsert weather data for this station
-                    n = db.upsert_weather_data(conn, df)
-                    print(f"Upserted {n} records for station {station_id}")
-            except Exception as e:
-                # Log and continue to next station on error
-                print(f"Error processing station {station_id}: {e}")
-                continue
+                    if result is not None:
+                        loaded[station_id] = result
+                pending = retry
+                if not pending:
+                    break
+        if not loaded:
+            return {"loaded": [], "failed": failed}
+
+        # Phase 3: load everything that was fetched in one batch
+        try:
+            # One transaction: stations and observations are committed together when the connection block exits
+            with db.get_connection(self.db_url) as conn:
+                # Lock the stations before writing any row: concurrent runs of the same stations (in any order)
+                # queue here instead of deadlocking on each other's row locks
+                db.lock_stations(conn, list(loaded))
+                # Upsert station metadata first (one statement) to ensure referential integrity
+                db.upsert_stations(conn, [station_meta for station_meta, _ in loaded.values()])
+                # Relaxed concat: an all-null column in one station's frame must not clash with floats in another.
+                # Kept lazy so the concatenation is fused with the staging casts instead of copied up front
+                df = pl.concat([frame.lazy() for _, frame in loaded.values()], how="vertical_relaxed")
+                db.upsert_weather_data(conn, df)
+                # Re-aggregate the metrics pre-aggregates for the loaded windows only, committed with the observations
+                db.refresh_metric_aggregates(conn, {station_id: windows[station_id][0] for station_id in loaded})
+        except Exception as e:
+            # The whole batch was rolled back
+            for station_id in loaded:
+                logger.error(f"Error processing station {station_id}: {e}")
+            return {"loaded": [], "failed": failed + list(loaded)}
+        for station_id, (_, frame) in loaded.items():
+            logger.info(f"Upserted {frame.height} records for station {station_id}")
+        return {"loaded": list(loaded), "failed": failed}
 
 
 def main() -> None:
     """
     Entry point for running the weather pipeline.
-    Loads environment variables, validates required config, and runs the pipeline.
-    Prints all output for Airflow/CI log capture.
+    Reads settings (environment and .env files), validates required config, and runs the pipeline.
+    Logs all output for Airflow/CI log capture.
     """
-    import json
-    # Load environment variables from app/.env if it exists, otherwise from .env in the project root
-    app_env_path = os.path.join(os.path.dirname(__file__), ".env")
-    root_env_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".env"))
-    if os.path.exists(app_env_path):
-        load_dotenv(app_env_path)
-    else:
-        load_dotenv(root_env_path)
-
-    NWS_STATION_ID = os.environ.get("NWS_STATION_ID")
-    DATABASE_URL = os.environ.get("DATABASE_URL")
-    if not NWS_STATION_ID:
+    settings = get_settings()
+    if not settings.station_ids:
         raise RuntimeError("NWS_STATION_ID environment variable is required.")
-    if not DATABASE_URL:
+    if not settings.database_url:
         raise RuntimeError("DATABASE_URL environment variable is required.")
 
-    # Parse NWS_STATION_ID as JSON array, or fallback to single string
-    try:
-        station_ids = json.loads(NWS_STATION_ID)
-        if isinstance(station_ids, str):
-            station_ids = [station_ids]
-        elif not isinstance(station_ids, list):
-            raise ValueError
-    except Exception:
-        # Fallback: treat as single station string
-        station_ids = [NWS_STATION_ID]
-
+    # The pipeline's phases lease connections one at a time; a small pool reuses one session for all of them
+    db.open_pool(settings.database_url, min_size=1, max_size=2)
     # Run the pipeline for the given station(s)
-    pipeline = WeatherPipeline(station_ids, DATABASE_URL)
-    pipeline.run()
+    pipeline = WeatherPipeline(settings.station_ids, settings.database_url)
+    result = pipeline.run()
+    if result["failed"]:
+        # Non-zero exit for CI/cron when any station could not be loaded
+        raise RuntimeError(f"Pipeline failed for station(s): {', '.join(result['failed'])}")
 
 
 if __name__ == "__main__":
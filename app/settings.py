@@ -0,0 +1,83 @@
+"""
+Settings module for the Weather Data Pipeline project.
+
+Centralizes the configuration read from environment variables and .env files:
+- Database connection (DATABASE_URL)
+- NWS API access (NWS_API_BASE_URL, NWS_USER_AGENT)
+- Default station selection (NWS_STATION_ID)
+- API tuning (API_THREAD_LIMIT, METRICS_CACHE_TTL)
+- Pipeline tuning (PIPELINE_MIN_INTERVAL)
+
+Usage hints:
+- Call get_settings(); the result is cached, so .env files are resolved once per process
+- Environment variables take precedence over app/.env, which takes precedence over the project root .env
+- NWS_STATION_ID accepts a single station string or a JSON array (see Settings.station_ids)
+"""
+
+import os
+from functools import lru_cache
+from typing import List, Optional
+
+import orjson
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+_APP_DIR = os.path.dirname(__file__)
+# Later files take precedence, so app/.env overrides the project root .env
+ENV_FILES = (
+    os.path.abspath(os.path.join(_APP_DIR, "..", ".env")),
+    os.path.join(_APP_DIR, ".env"),
+)
+
+
+def parse_station_ids(value: str) -> List[str]:
+    """
+    Parse a station ID setting given as a JSON array or a single station string.
+
+    Args:
+        value (str): e.g. 'KATL' or '["KATL", "003PG"]'
+    Returns:
+        List[str]: List of station identifiers
+    """
+    try:
+        station_ids = orjson.loads(value)
+    except orjson.JSONDecodeError:
+        # Not JSON: treat as a single station string
+        return [value]
+    if isinstance(station_ids, str):
+        return [station_ids]
+    if isinstance(station_ids, list):
+        return station_ids
+    return [value]
+
+
+class Settings(BaseSettings):
+    """
+    Application settings, populated from environment variables (case-insensitive) and .env files.
+    """
+    model_config = SettingsConfigDict(env_file=ENV_FILES, extra="ignore")
+
+    database_url: str = ""
+    nws_api_base_url: str = "https://api.weather.gov"
+    nws_user_agent: str = "myweatherapp.com, contact@myweatherapp.com"
+    nws_station_id: Optional[str] = None
+    api_thread_limit: int = 100
+    metrics_cache_ttl: int = 300
+    # Seconds: stations whose latest stored observation is newer than this are not fetched (0 disables)
+    pipeline_min_interval: int = 300
+
+    @property
+    def station_ids(self) -> List[str]:
+        """
+        Default station IDs parsed from NWS_STATION_ID (empty if unset).
+        """
+        if not self.nws_station_id:
+            return []
+        return parse_station_ids(self.nws_station_id)
+
+
+@lru_cache
+def get_settings() -> Settings:
+    """
+    Return the process-wide settings, reading the environment and .env files on first use only.
+    """
+    return Settings()
@@ -1,34 +1,42 @@
+from app.api import NWSObservation, NWSValue
+from typing import Dict, List, cast
 import polars as pl
 
+# NWS measurement properties (each a {"value": ...} object) and the column they are loaded into
+MEASUREMENT_COLUMNS = {
+    "temperature": "temperature",
+    "windSpeed": "wind_speed",
+    "relativeHumidity": "relative_humidity",
+    "barometricPressure": "barometric_pressure",
+    "precipitationLastHour": "precipitation_last_hour",
+    "dewpoint": "dewpoint",
+}
 
-def flatten_observations(observations: list[dict]) -> pl.DataFrame:
+
+def flatten_observations(observations: List[NWSObservation]) -> pl.DataFrame:
     """
     Flatten a list of NWS API observation dicts into a Polars DataFrame.
+    Each field is gathered into its own typed column; station ID parsing and rounding then run as vectorized Polars expressions.
 
     Args:
-        observations (list[dict]): List of NWS API observation dicts.
+        observations (List[NWSObservation]): List of NWS API observation features.
     Returns:
-        pl.DataFrame: Flattened DataFrame with columns for station_id, timestamp, temperature, wind_speed, relative_humidity, barometric_pressure, precipitation_last_hour, dewpoint.
+        pl.DataFrame: Flattened DataFrame with columns for station_id, observation_timestamp (UTC datetime), temperature, wind_speed, relative_humidity, barometric_pressure, precipitation_last_hour, dewpoint.
     """
-    records = []
-    for obs in observations:
-        props = obs.get("properties", {})
-        station = props.get("station", "")
-        timestamp = props.get("timestamp", None)
-        temp = props.get("temperature", {}).get("value")
-        wind = props.get("windSpeed", {}).get("value")
-        relative_humidity = props.get("relativeHumidity", {}).get("value")
-        barometric_pressure = props.get("barometricPressure", {}).get("value")
-        precipitation_last_hour = props.get("precipitationLastHour", {}).get("value")
-        dewpoint = props.get("dewpoint", {}).get("value")
-        records.append({
-            "station_id": station.split("/")[-1] if station else None,
-            "observation_timestamp": timestamp,
-            "temperature": round(temp, 2) if temp is not None else None,
-            "wind_speed": round(wind, 2) if wind is not None else None,
-            "relative_humidity": round(relative_humidity, 2) if relative_humidity is not None else None,
-            "barometric_pressure": round(barometric_pressure, 2) if barometric_pressure is not None else None,
-            "precipitation_last_hour": round(precipitation_last_hour, 2) if precipitation_last_hour is not None else None,
-            "dewpoint": round(dewpoint, 2) if dewpoint is not None else None,
-        })
-    return pl.DataFrame(records)
+    props = [obs.get("properties", {}) for obs in observations]
+    columns = {
+        "station_id": pl.Series([p.get("station") or None for p in props], dtype=pl.Utf8),
+        "observation_timestamp": pl.Series([p.get("timestamp") for p in props], dtype=pl.Utf8),
+    }
+    # Measurement properties are looked up by name below: same dicts, typed by their common value shape
+    measurements = cast(List[Dict[str, NWSValue]], props)
+    for field, column in MEASUREMENT_COLUMNS.items():
+        # strict=False: a non-numeric value becomes null instead of failing the whole column
+        columns[column] = pl.Series([m.get(field, {}).get("value") for m in measurements], dtype=pl.Float64, strict=False)
+    return pl.DataFrame(columns).with_columns(
+        # Station URL -> station ID (last path segment), one regex pass without building per-row lists
+        pl.col("station_id").str.extract(r"([^/]+)$"),
+        # ISO 8601 with any UTC offset -> timestamptz-compatible datetimes, so binary COPY sends 8-byte timestamps
+        pl.col("observation_timestamp").str.to_datetime("%+", time_unit="us", time_zone="UTC"),
+        pl.col(list(MEASUREMENT_COLUMNS.values())).round(2),
+    )
@@ -3,8 +3,9 @@ Airflow DAG for the Weather Data Pipeline project.
 
 This DAG orchestrates the daily ETL process:
 - Triggers the FastAPI pipeline endpoint to fetch, transform, and load weather data
+- Polls the pipeline job until it finishes, failing the task if the job failed or is no longer known to the API
 - Provides start and end dummy tasks for clear DAG visualization
-- Uses HttpOperator to call the API endpoint inside the app container
+- Uses HttpOperator and HttpSensor to call the API endpoints inside the app container
 
 Usage hints:
 - Requires an Airflow HTTP connection named 'app_api' (see Airflow UI > Admin > Connections)
@@ -15,7 +16,9 @@ Usage hints:
 """
 
 from airflow.decorators import dag, task
+from airflow.exceptions import AirflowException
 from airflow.providers.http.operators.http import HttpOperator
+from airflow.providers.http.sensors.http import HttpSensor
 from datetime import datetime, timedelta
 
 default_args = {
@@ -26,6 +29,26 @@ default_args = {
 }
 
 
+def pipeline_job_finished(response) -> bool:
+    """
+    Response check for the job polling sensor: True once the job succeeded, raises if it failed.
+    Prints the captured pipeline output so it shows up in the Airflow task log.
+    A 404 means the job is unknown to the API (expired, or lost when the API restarted) and fails the task;
+    other error responses are treated as transient and polled again.
+    """
+    if response.status_code == 404:
+        raise AirflowException(f"Pipeline job not found (expired or API restarted): {response.url}")
+    if not response.ok:
+        return False
+    job = response.json()
+    if job["state"] in ("succeeded", "failed"):
+        print(job.get("output", ""))
+        if job["state"] == "failed":
+            raise AirflowException(f"Pipeline job {job['job_id']} failed: {job.get('error')}")
+        return True
+    return False
+
+
 # Define the DAG
 @dag(
     default_args=default_args,
@@ -39,7 +62,8 @@ def weather_pipeline():
     """
     Orchestrates the weather data pipeline ETL process.
     - start: Dummy task for DAG start
-    - run_pipeline_task: Triggers the FastAPI /v1/run-pipeline endpoint
+    - run_pipeline_task: Triggers the FastAPI /v1/run-pipeline endpoint (returns a job id)
+    - wait_for_pipeline_task: Polls /v1/run-pipeline/{job_id} until the job has finished
     - end: Dummy task for DAG end
 
     To trigger the pipeline for multiple stations, set the 'data' parameter in HttpOperator as follows:
@@ -67,12 +91,26 @@ def weather_pipeline():
         headers={'Content-Type': 'application/json'},
         # Uncomment and edit the next line to trigger for specific stations:
         # data=json.dumps({"station_ids": ["KATL", "003PG"]}),
+        response_filter=lambda response: response.json()["job_id"],  # Pushed to XCom for the sensor
         log_response=True
     )
+    # HttpSensor polls the queued job until the pipeline run has finished
+    wait_for_pipeline_task = HttpSensor(
+        task_id='wait_for_weather_pipeline',
+        http_conn_id='app_api',
+        endpoint="v1/run-pipeline/{{ ti.xcom_pull(task_ids='trigger_weather_pipeline') }}",
+        method='GET',
+        response_check=pipeline_job_finished,
+        # Let pipeline_job_finished see error responses: by default the sensor keeps poking on 404
+        extra_options={'check_response': False},
+        poke_interval=15,
+        timeout=60 * 60,
+        mode='reschedule'  # Frees the worker slot between polls
+    )
     end_task = end()
 
     # Set task dependencies for clear DAG flow
-    start_task >> run_pipeline_task >> end_task
+    start_task >> run_pipeline_task >> wait_for_pipeline_task >> end_task
 
 
 weather_pipeline_dag = weather_pipeline()
@@ -49,7 +49,7 @@ until OUTPUT=$(poetry run python -c "import psycopg; psycopg.connect('$DATABASE_
 done
 
 echo "[entrypoint] Postgres is available. Initializing DB schema..."
-poetry run python -c "import app.db; import os; db_url=os.environ.get('DATABASE_URL', '$DATABASE_URL'); conn=app.db.get_connection(db_url); app.db.create_schema(conn); conn.close()"
+poetry run python -c "import app.db; import os; db_url=os.environ.get('DATABASE_URL', '$DATABASE_URL'); conn=app.db.connect(db_url); app.db.create_schema(conn); conn.commit(); conn.close()"
 
 echo "[entrypoint] Starting FastAPI app with Uvicorn..."
 exec poetry run uvicorn app.api:app --host 0.0.0.0 --port 8000
\ No newline at end of file
@@ -1,3 +1,8 @@
+import contextlib
+import json
+import logging
+import threading
+import pytest
 from fastapi.testclient import TestClient
 from app import api
 import app.pipeline
@@ -5,6 +10,13 @@ import app.pipeline
 client = TestClient(api.app)
 
 
+@pytest.fixture(autouse=True)
+def clear_metrics_cache(monkeypatch):
+    api._clear_metrics_cache()
+    api._STATION_METADATA_CACHE.clear()
+    monkeypatch.setattr(api, "_health_last_ok", None)
+
+
 class DummyResponse:
     def __init__(self, json_data=None):
         self._json = json_data or {}
@@ -12,27 +24,92 @@ class DummyResponse:
     def json(self):
         return self._json
 
+    @property
+    def content(self):
+        return json.dumps(self._json).encode()
+
     def raise_for_status(self):
         pass
 
 
 def test_fetch_observations_success(monkeypatch):
-    def mock_get(url, params, timeout, **kwargs):
+    def mock_get(url, params=None, **kwargs):
+        assert url == "/stations/KATL/observations"
         return DummyResponse(json_data={"features": [{"properties": {"station": "KATL"}}]})
-    monkeypatch.setattr(api.httpx, "get", mock_get)
+    monkeypatch.setattr(api.NWS_CLIENT, "get", mock_get)
     obs = api.fetch_observations("KATL", "2024-01-01T00:00:00Z", "2024-01-02T00:00:00Z")
     assert isinstance(obs, list)
     assert obs[0]["properties"]["station"] == "KATL"
 
 
+def test_fetch_observations_decodes_used_fields_only(monkeypatch):
+    feature = {
+        "id": "https://api.weather.gov/stations/KATL/observations/2024-01-01T00:00:00+00:00",
+        "geometry": {"type": "Point", "coordinates": [-84.4, 33.6]},
+        "properties": {
+            "station": "https://api.weather.gov/stations/KATL",
+            "timestamp": "2024-01-01T00:00:00+00:00",
+            "rawMessage": "KATL 010000Z ...",
+            "temperature": {"unitCode": "wmoUnit:degC", "value": 10, "qualityControl": "V"},
+            "windSpeed": {"unitCode": "wmoUnit:km_h-1", "value": None, "qualityControl": "Z"},
+        },
+    }
+    monkeypatch.setattr(api.NWS_CLIENT, "get", lambda url, params=None, **kwargs: DummyResponse(json_data={"features": [feature]}))
+    obs = api.fetch_observations("KATL", "2024-01-01T00:00:00Z", "2024-01-02T00:00:00Z")
+    assert obs == [{"properties": {
+        "station": "https://api.weather.gov/stations/KATL",
+        "timestamp": "2024-01-01T00:00:00+00:00",
+        "temperature": {"value": 10.0},
+        "windSpeed": {"value": None},
+    }}]
+
+
+def test_fetch_station_metadata(monkeypatch):
+    def mock_get(url, **kwargs):
+        assert url == "/stations/KATL"
+        return DummyResponse(json_data={
+            "properties": {"name": "Atlanta", "timeZone": "America/New_York"},
+            "geometry": {"coordinates": [-84.4, 33.6]},
+        })
+    monkeypatch.setattr(api.NWS_CLIENT, "get", mock_get)
+    meta = api.fetch_station_metadata("KATL")
+    assert meta["station_id"] == "KATL"
+    assert (meta["latitude"], meta["longitude"]) == (33.6, -84.4)
+    assert meta["name"] == "Atlanta"
+
+    # Served from the cache on the next call
+    def fail_get(url, **kwargs):
+        raise AssertionError("unexpected request")
+    monkeypatch.setattr(api.NWS_CLIENT, "get", fail_get)
+    assert api.fetch_station_metadata("KATL") == meta
+
+
 def test_run_pipeline_success(monkeypatch):
     class DummyPipeline:
         def run(self):
-            print("Pipeline started")
+            logging.getLogger("app.pipeline").info("Pipeline started")
+            return {"loaded": ["KATL"], "failed": []}
     monkeypatch.setattr(app.pipeline, "WeatherPipeline", lambda *a, **kw: DummyPipeline())
     response = client.post("/v1/run-pipeline")
-    assert response.status_code == 200
-    assert "Pipeline started" in response.json().get("output", "")
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    # TestClient runs background tasks before returning, so the job has finished
+    job = client.get(f"/v1/run-pipeline/{job_id}").json()
+    assert job["state"] == "succeeded"
+    assert job["station_ids"] == ["KATL"]
+    assert "Pipeline started" in job.get("output", "")
+
+
+def test_capture_logs_ignores_other_contexts():
+    log = logging.getLogger("app.pipeline")
+    with api.capture_logs() as output:
+        log.info("inside")
+        # A thread started without a copied context belongs to another run
+        other = threading.Thread(target=log.info, args=("other run",))
+        other.start()
+        other.join()
+    log.info("after")
+    assert output.getvalue() == "inside"
 
 
 def test_run_pipeline_no_new_data(monkeypatch):
@@ -41,8 +118,9 @@ def test_run_pipeline_no_new_data(monkeypatch):
             raise RuntimeError("No new observations to process.")
     monkeypatch.setattr(app.pipeline, "WeatherPipeline", lambda *a, **kw: DummyPipeline())
     response = client.post("/v1/run-pipeline")
-    assert response.status_code == 200
-    assert response.json().get("status") == "No new observations to process."
+    assert response.status_code == 202
+    job = client.get(f"/v1/run-pipeline/{response.json()['job_id']}").json()
+    assert job.get("status") == "No new observations to process."
 
 
 def test_run_pipeline_error(monkeypatch):
@@ -51,8 +129,30 @@ def test_run_pipeline_error(monkeypatch):
             raise Exception("Some error")
     monkeypatch.setattr(app.pipeline, "WeatherPipeline", lambda *a, **kw: DummyPipeline())
     response = client.post("/v1/run-pipeline")
-    assert response.status_code == 200
-    assert "Pipeline failed" in response.json().get("error", "")
+    assert response.status_code == 202
+    job = client.get(f"/v1/run-pipeline/{response.json()['job_id']}").json()
+    assert job["state"] == "failed"
+    assert "Pipeline failed" in job.get("error", "")
+
+
+def test_run_pipeline_station_failures(monkeypatch):
+    class DummyPipeline:
+        def run(self):
+            # run() logs station errors instead of raising them
+            logging.getLogger("app.pipeline").error("Error processing station KATL: boom")
+            return {"loaded": [], "failed": ["KATL"]}
+    monkeypatch.setattr(app.pipeline, "WeatherPipeline", lambda *a, **kw: DummyPipeline())
+    response = client.post("/v1/run-pipeline")
+    assert response.status_code == 202
+    job = client.get(f"/v1/run-pipeline/{response.json()['job_id']}").json()
+    assert job["state"] == "failed"
+    assert job["error"] == "Pipeline failed for station(s): KATL"
+    assert "Error processing station KATL" in job.get("output", "")
+
+
+def test_pipeline_job_not_found():
+    response = client.get("/v1/run-pipeline/unknown")
+    assert response.status_code == 404
 
 
 def test_average_temperature_db_error(monkeypatch):
@@ -73,6 +173,30 @@ def test_max_wind_speed_change_db_error(monkeypatch):
     assert "Database not reachable" in response.json()["detail"]
 
 
+def test_metrics_summary_db_error(monkeypatch):
+    def fail_get_connection(*args, **kwargs):
+        raise api.OperationalError("fail")
+    monkeypatch.setattr(api, "get_connection", fail_get_connection)
+    response = client.get("/v1/metrics/summary")
+    assert response.status_code == 503
+    assert "Database not reachable" in response.json()["detail"]
+
+
+def test_average_temperature_cached(monkeypatch):
+    calls = []
+
+    def ok_get_connection(*args, **kwargs):
+        calls.append(args)
+        return contextlib.nullcontext(object())
+    monkeypatch.setattr(api, "get_connection", ok_get_connection)
+    monkeypatch.setattr(api, "get_average_temperature_last_week", lambda conn: [{"station_id": "KATL", "avg_temperature": 20.0}])
+    first = client.get("/v1/metrics/average-temperature")
+    second = client.get("/v1/metrics/average-temperature")
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json() == [{"station_id": "KATL", "avg_temperature": 20.0}]
+    assert len(calls) == 1
+
+
 def test_health_healthy(monkeypatch):
     def ok_get_connection(*args, **kwargs):
         class Conn:
@@ -101,3 +225,23 @@ def test_health_unhealthy(monkeypatch):
     response = client.get("/v1/health")
     assert response.status_code == 503
     assert "Database not reachable" in response.json()["detail"]
+
+
+def test_health_reuses_recent_success(monkeypatch):
+    calls = []
+
+    class Cur:
+        def execute(self, sql):
+            calls.append(sql)
+
+    class Conn:
+        def cursor(self):
+            return Cur()
+    monkeypatch.setattr(api, "get_connection", lambda *args, **kwargs: contextlib.nullcontext(Conn()))
+    assert client.get("/v1/health").status_code == 200
+    assert client.get("/v1/health").status_code == 200
+    assert len(calls) == 1
+    # Once the interval has passed, the database is checked again
+    monkeypatch.setattr(api, "_health_last_ok", api.time.monotonic() - api.HEALTH_CHECK_INTERVAL)
+    assert client.get("/v1/health").status_code == 200
+    assert len(calls) == 2
@@ -1,22 +1,58 @@
+import contextlib
+from datetime import datetime, timezone
+import os
+import threading
 import pytest
 import polars as pl
 from app import db
 from psycopg import OperationalError
+from psycopg.pq import TransactionStatus
+from types import SimpleNamespace
 from typing import Any
 
 
+class DummyCopy:
+    def __init__(self):
+        self.types = None
+        self.rows = []
+
+    def set_types(self, types):
+        self.types = types
+
+    def write_row(self, row):
+        self.rows.append(row)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
 class DummyCursor:
     def __init__(self):
         self.executed = []
         self.results = []
         self.fetchone_result: Any = None
+        self.copies = []
 
-    def execute(self, sql, params=None):
+    def execute(self, sql, params=None, prepare=None):
         self.executed.append((sql, params))
 
+    def executemany(self, sql, params_seq):
+        self.executed.append((sql, list(params_seq)))
+
+    def copy(self, statement):
+        copy = DummyCopy()
+        self.copies.append((statement, copy))
+        return copy
+
     def fetchone(self):
         return self.fetchone_result
 
+    def fetchall(self):
+        return self.results
+
     def __enter__(self):
         return self
 
@@ -25,9 +61,12 @@ class DummyCursor:
 
 
 class DummyConn:
-    def __init__(self):
+    def __init__(self, transaction_status=TransactionStatus.INTRANS):
         self.committed = False
+        self.rolled_back = False
+        self.transactions = 0
         self.cursor_obj = DummyCursor()
+        self.info = SimpleNamespace(transaction_status=transaction_status)
 
     def cursor(self):
         return self.cursor_obj
@@ -35,13 +74,49 @@ class DummyConn:
     def commit(self):
         self.committed = True
 
+    def rollback(self):
+        self.rolled_back = True
+
+    def transaction(self):
+        self.transactions += 1
+        return contextlib.nullcontext()
+
+    def pipeline(self):
+        return contextlib.nullcontext()
+
 
 def test_create_schema_idempotent():
     conn = DummyConn()
     db.create_schema(conn)  # type: ignore[arg-type]
     db.create_schema(conn)  # type: ignore[arg-type]
     assert any("CREATE TABLE" in sql for sql, _ in conn.cursor_obj.executed)
+    # The whole schema script is sent in a single execute per call
+    assert conn.cursor_obj.executed == [(db.SCHEMA_SQL, None)] * 2
+    # The caller owns the transaction
+    assert not conn.committed
+
+
+def test_ensure_schema_once_per_db_url(monkeypatch):
+    monkeypatch.setattr(db, "_SCHEMA_READY", set())
+    conn = DummyConn()
+    db.ensure_schema(conn, "postgresql://a")  # type: ignore[arg-type]
+    db.ensure_schema(conn, "postgresql://a")  # type: ignore[arg-type]
+    assert len(conn.cursor_obj.executed) == 1
+    # Committed before the URL is memoized
     assert conn.committed
+    db.ensure_schema(conn, "postgresql://b")  # type: ignore[arg-type]
+    assert len(conn.cursor_obj.executed) == 2
+
+
+def test_ensure_schema_retries_after_failure(monkeypatch):
+    monkeypatch.setattr(db, "_SCHEMA_READY", set())
+
+    def fail(conn):
+        raise OperationalError("fail")
+    monkeypatch.setattr(db, "create_schema", fail)
+    with pytest.raises(OperationalError):
+        db.ensure_schema(DummyConn(), "postgresql://a")  # type: ignore[arg-type]
+    assert "postgresql://a" not in db._SCHEMA_READY
 
 
 def test_upsert_station_full_partial():
@@ -53,7 +128,37 @@ def test_upsert_station_full_partial():
     meta2 = {"station_id": "KATL", "name": "Test2"}
     db.upsert_station(conn, meta2)  # type: ignore[arg-type]
     assert any("INSERT INTO wxinfo.stations" in sql for sql, _ in conn.cursor_obj.executed)
-    assert conn.committed
+    assert not conn.committed
+
+
+def test_upsert_stations_single_statement():
+    conn = DummyConn()
+    db.upsert_stations(conn, [  # type: ignore[arg-type]
+        {"station_id": "KATL", "name": "Old"},
+        {"station_id": "003PG", "name": "Pine Grove", "latitude": 1.0, "longitude": 2.0},
+        {"station_id": "KATL", "name": "Atlanta"},
+    ])
+    assert len(conn.cursor_obj.executed) == 1
+    _, params = conn.cursor_obj.executed[0]
+    # Duplicates collapse to the last entry, columns are passed as arrays
+    assert params[0] == ["KATL", "003PG"]
+    assert params[1] == ["Atlanta", "Pine Grove"]
+    assert params[3] == [None, 1.0]
+    assert not conn.committed
+
+
+def test_upsert_stations_mixed_int_float_coordinates():
+    conn = DummyConn()
+    db.upsert_stations(conn, [  # type: ignore[arg-type]
+        {"station_id": "KATL", "latitude": 33, "longitude": -84.44},
+        {"station_id": "003PG", "latitude": 34.5, "longitude": -85},
+        {"station_id": "KXYZ"},
+    ])
+    _, params = conn.cursor_obj.executed[0]
+    # psycopg refuses to dump lists that mix int and float
+    assert params[3] == [33.0, 34.5, None]
+    assert params[4] == [-84.44, -85.0, None]
+    assert all(isinstance(v, float) for v in params[3] + params[4] if v is not None)
 
 
 def test_upsert_weather_data_empty_valid():
@@ -76,7 +181,260 @@ def test_upsert_weather_data_empty_valid():
     n2 = db.upsert_weather_data(conn, df)  # type: ignore[arg-type]
     assert n2 == 1
     assert any("INSERT INTO wxinfo.weather_observations" in sql for sql, _ in conn.cursor_obj.executed)
-    assert conn.committed
+    # The staging table is dropped with the merge so another load can run in the same transaction
+    assert conn.cursor_obj.executed[-1][0].endswith("DROP TABLE _stage_obs;")
+    # Staged as float8 whatever the width of the target columns
+    assert "temperature float8" in conn.cursor_obj.executed[0][0]
+    assert len(conn.cursor_obj.copies) == 1
+    statement, copy = conn.cursor_obj.copies[0]
+    assert copy.types == ["text", "timestamptz", "float8", "float8", "float8", "float8", "float8", "float8"]
+    # Timestamps are parsed so binary COPY can send them natively; missing columns are staged as NULL
+    ts = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    assert copy.rows == [("KATL", ts, 10.0, 5.0, None, 50.0, None, 10.0)]
+    assert not conn.committed
+
+
+def test_upsert_weather_data_lazy_frame_in_slices(monkeypatch):
+    monkeypatch.setattr(db, "COPY_SLICE_ROWS", 2)
+    conn = DummyConn()
+    assert db.upsert_weather_data(conn, pl.DataFrame({"station_id": []}).lazy()) == 0  # type: ignore[arg-type]
+    lf = pl.LazyFrame({
+        "station_id": ["KATL"] * 5,
+        "observation_timestamp": [f"2024-01-01T0{h}:00:00Z" for h in range(5)],
+        "temperature": [1, 2, 3, 4, 5],
+    })
+    n = db.upsert_weather_data(conn, lf)  # type: ignore[arg-type]
+    assert n == 5
+    _, copy = conn.cursor_obj.copies[0]
+    # Every slice goes through the same COPY stream, ints widened to float8
+    assert [row[2] for row in copy.rows] == [1.0, 2.0, 3.0, 4.0, 5.0]
+
+
+def test_upsert_weather_data_collapses_duplicate_keys():
+    conn = DummyConn()
+    df = pl.DataFrame({
+        "station_id": ["KATL", "KATL", "003PG"],
+        "observation_timestamp": ["2024-01-01T00:00:00Z", "2024-01-01T00:00:00+00:00", "2024-01-01T00:00:00Z"],
+        "temperature": [1.0, 2.0, 3.0],
+    })
+    assert db.upsert_weather_data(conn, df) == 2  # type: ignore[arg-type]
+    _, copy = conn.cursor_obj.copies[0]
+    # The last row per key wins, order is kept
+    assert [(row[0], row[2]) for row in copy.rows] == [("KATL", 2.0), ("003PG", 3.0)]
+
+
+def test_upsert_weather_data_without_temp_privilege():
+    conn = DummyConn()
+
+    def execute(sql, params=None, prepare=None):
+        if sql.startswith("CREATE TEMP TABLE"):
+            raise db.errors.InsufficientPrivilege("permission denied to create temporary tables")
+        conn.cursor_obj.executed.append((sql, params))
+    conn.cursor_obj.execute = execute  # type: ignore[method-assign]
+    df = pl.DataFrame({
+        "station_id": ["KATL", "KATL"],
+        "observation_timestamp": ["2024-01-01T00:00:00+00:00", "2024-01-01T01:00:00+00:00"],
+        "temperature": [10.0, None],
+    })
+    n = db.upsert_weather_data(conn, df)  # type: ignore[arg-type]
+    assert n == 2
+    # Falls back to one executemany of the single-row upsert
+    sql, rows = conn.cursor_obj.executed[-1]
+    assert sql == db.UPSERT_OBSERVATION_SQL
+    assert [row[:3] for row in rows] == [
+        ("KATL", datetime(2024, 1, 1, 0, tzinfo=timezone.utc), 10.0),
+        ("KATL", datetime(2024, 1, 1, 1, tzinfo=timezone.utc), None),
+    ]
+    assert not conn.committed
+
+
+def test_upsert_weather_data_without_open_transaction():
+    # No transaction open: no conn.transaction() block, which would be a top-level transaction committed on exit
+    conn = DummyConn(transaction_status=TransactionStatus.IDLE)
+    df = pl.DataFrame({"station_id": ["KATL"], "observation_timestamp": ["2024-01-01T00:00:00Z"]})
+    assert db.upsert_weather_data(conn, df) == 1  # type: ignore[arg-type]
+    assert conn.transactions == 0
+    assert not conn.committed
+    # Inside the caller's transaction the staging runs in a savepoint
+    conn = DummyConn()
+    db.upsert_weather_data(conn, df)  # type: ignore[arg-type]
+    assert conn.transactions == 1
+
+
+@pytest.mark.skipif(not os.environ.get("WXINFO_TEST_DATABASE_URL"), reason="WXINFO_TEST_DATABASE_URL not set")
+def test_upsert_weather_data_rollback_on_fresh_connection():
+    # Real PostgreSQL: rows loaded on a connection without an open transaction are undone by rollback()
+    import psycopg
+    db_url = os.environ["WXINFO_TEST_DATABASE_URL"]
+    station_id = "ZZTEST"
+    with psycopg.connect(db_url) as conn:
+        db.create_schema(conn)
+        db.upsert_stations(conn, [{"station_id": station_id}])
+    df = pl.DataFrame({"station_id": [station_id], "observation_timestamp": ["2024-01-01T00:00:00Z"], "temperature": [1.0]})
+    try:
+        with psycopg.connect(db_url) as conn:
+            assert db.upsert_weather_data(conn, df) == 1
+            conn.rollback()
+            count = conn.execute(
+                "SELECT count(*) FROM wxinfo.weather_observations WHERE station_id = %s", (station_id,)
+            ).fetchone()
+            assert count == (0,)
+    finally:
+        with psycopg.connect(db_url) as conn:
+            conn.execute("DELETE FROM wxinfo.weather_observations WHERE station_id = %s", (station_id,))
+            conn.execute("DELETE FROM wxinfo.stations WHERE station_id = %s", (station_id,))
+
+
+def test_refresh_metric_aggregates_loaded_windows_only():
+    conn = DummyConn()
+    db.refresh_metric_aggregates(conn, {})  # type: ignore[arg-type]
+    assert conn.cursor_obj.executed == []
+    since = datetime(2024, 1, 1, 12, 30, tzinfo=timezone.utc)
+    db.refresh_metric_aggregates(conn, {"KATL": since})  # type: ignore[arg-type]
+    # The stations are locked, affected hours are cleared and re-aggregated, without committing
+    (lock_sql, lock_params), (delete_sql, delete_params), (insert_sql, insert_params) = conn.cursor_obj.executed
+    assert "pg_advisory_xact_lock" in lock_sql
+    assert lock_params == (["KATL"],)
+    assert delete_sql.strip().startswith("DELETE FROM wxinfo.hourly_temperature")
+    assert "INSERT INTO wxinfo.hourly_temperature" in insert_sql
+    assert "ON CONFLICT (station_id, observation_hour) DO UPDATE" in insert_sql
+    assert delete_params == insert_params == (["KATL"], [since])
+    assert not conn.committed
+
+
+def test_refresh_metric_aggregates_locks_stations_in_sorted_order():
+    conn = DummyConn()
+    since = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    db.refresh_metric_aggregates(conn, {"KATL": since, "003PG": since})  # type: ignore[arg-type]
+    _, lock_params = conn.cursor_obj.executed[0]
+    assert lock_params == (["003PG", "KATL"],)
+
+
+def test_lock_stations_sorted_unique():
+    conn = DummyConn()
+    db.lock_stations(conn, [])  # type: ignore[arg-type]
+    assert conn.cursor_obj.executed == []
+    db.lock_stations(conn, ["KATL", "003PG", "KATL"])  # type: ignore[arg-type]
+    assert conn.cursor_obj.executed == [(db.LOCK_STATIONS_SQL, (["003PG", "KATL"],))]
+    assert not conn.committed
+
+
+@pytest.mark.skipif(not os.environ.get("WXINFO_TEST_DATABASE_URL"), reason="WXINFO_TEST_DATABASE_URL not set")
+def test_load_opposite_station_order_serialized():
+    # Real PostgreSQL: loads of [A, B] and [B, A] with the same observations queue instead of deadlocking
+    import psycopg
+    db_url = os.environ["WXINFO_TEST_DATABASE_URL"]
+    station_ids = ["ZZTESTA", "ZZTESTB"]
+    since = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def frame(order):
+        return pl.DataFrame({
+            "station_id": [sid for sid in order for _ in range(2)],
+            "observation_timestamp": ["2024-01-01T00:10:00Z", "2024-01-01T00:40:00Z"] * len(order),
+            "temperature": [10.0, 20.0] * len(order),
+        })
+
+    def load(conn, order):
+        db.lock_stations(conn, order)
+        db.upsert_stations(conn, [{"station_id": sid} for sid in order])
+        db.upsert_weather_data(conn, frame(order))
+        db.refresh_metric_aggregates(conn, {sid: since for sid in order})
+    with psycopg.connect(db_url) as conn:
+        db.create_schema(conn)
+    first = psycopg.connect(db_url)
+    second = psycopg.connect(db_url)
+    errors = []
+
+    def load_second():
+        try:
+            load(second, station_ids[::-1])
+            second.commit()
+        except Exception as e:
+            errors.append(e)
+            second.rollback()
+    try:
+        load(first, station_ids)
+        other = threading.Thread(target=load_second)
+        other.start()
+        other.join(timeout=0.5)
+        # Waiting on the first load's station locks, before writing anything
+        assert other.is_alive()
+        with psycopg.connect(db_url) as conn:
+            waiting = conn.execute(
+                "SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' AND NOT granted AND pid = %s",
+                (second.info.backend_pid,),
+            ).fetchone()
+            assert waiting == (1,)
+        first.commit()
+        other.join(timeout=10)
+        assert not other.is_alive()
+        assert errors == []
+        with psycopg.connect(db_url) as conn:
+            rows = conn.execute(
+                "SELECT station_id, temperature_sum, temperature_count FROM wxinfo.hourly_temperature"
+                " WHERE station_id = ANY(%s) ORDER BY station_id",
+                (station_ids,),
+            ).fetchall()
+            assert rows == [("ZZTESTA", 30.0, 2), ("ZZTESTB", 30.0, 2)]
+    finally:
+        first.close()
+        second.close()
+        with psycopg.connect(db_url) as conn:
+            for table in ("hourly_temperature", "weather_observations", "stations"):
+                conn.execute(f"DELETE FROM wxinfo.{table} WHERE station_id = ANY(%s)", (station_ids,))
+
+
+@pytest.mark.skipif(not os.environ.get("WXINFO_TEST_DATABASE_URL"), reason="WXINFO_TEST_DATABASE_URL not set")
+def test_refresh_metric_aggregates_concurrent_same_station():
+    # Real PostgreSQL: two loads refreshing the same station must not collide on the rollup's primary key
+    import psycopg
+    db_url = os.environ["WXINFO_TEST_DATABASE_URL"]
+    station_id = "ZZTEST"
+    since = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    df = pl.DataFrame({
+        "station_id": [station_id, station_id],
+        "observation_timestamp": ["2024-01-01T00:10:00Z", "2024-01-01T00:40:00Z"],
+        "temperature": [10.0, 20.0],
+    })
+    with psycopg.connect(db_url) as conn:
+        db.create_schema(conn)
+        db.upsert_stations(conn, [{"station_id": station_id}])
+        db.upsert_weather_data(conn, df)
+        conn.execute("DELETE FROM wxinfo.hourly_temperature WHERE station_id = %s", (station_id,))
+    first = psycopg.connect(db_url)
+    second = psycopg.connect(db_url)
+    errors = []
+
+    def refresh_second():
+        try:
+            db.refresh_metric_aggregates(second, {station_id: since})
+            second.commit()
+        except Exception as e:
+            errors.append(e)
+            second.rollback()
+    try:
+        db.refresh_metric_aggregates(first, {station_id: since})
+        # The second refresh starts while the first one's rows are still uncommitted
+        other = threading.Thread(target=refresh_second)
+        other.start()
+        other.join(timeout=0.5)
+        first.commit()
+        other.join(timeout=10)
+        assert not other.is_alive()
+        assert errors == []
+        with psycopg.connect(db_url) as conn:
+            rows = conn.execute(
+                "SELECT temperature_sum, temperature_count FROM wxinfo.hourly_temperature WHERE station_id = %s",
+                (station_id,),
+            ).fetchall()
+            assert rows == [(30.0, 2)]
+    finally:
+        first.close()
+        second.close()
+        with psycopg.connect(db_url) as conn:
+            conn.execute("DELETE FROM wxinfo.hourly_temperature WHERE station_id = %s", (station_id,))
+            conn.execute("DELETE FROM wxinfo.weather_observations WHERE station_id = %s", (station_id,))
+            conn.execute("DELETE FROM wxinfo.stations WHERE station_id = %s", (station_id,))
 
 
 def test_get_latest_observation_timestamp_none_and_value():
@@ -90,7 +448,17 @@ def test_get_latest_observation_timestamp_none_and_value():
     now = datetime.now()
     conn.cursor_obj.fetchone_result = (now,)
     ts2 = db.get_latest_observation_timestamp(conn, "KATL")  # type: ignore[arg-type]
-    assert ts2 == now.isoformat()
+    assert ts2 == now
+
+
+def test_get_latest_observation_timestamps():
+    conn = DummyConn()
+    ts = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    # Stations without data return no row
+    conn.cursor_obj.results = [("KATL", ts)]
+    latest = db.get_latest_observation_timestamps(conn, ["KATL", "003PG"])  # type: ignore[arg-type]
+    assert latest == {"KATL": ts, "003PG": None}
+    assert conn.cursor_obj.executed[-1][1] == (["KATL", "003PG"],)
 
 
 def test_get_connection_fail(monkeypatch):
@@ -98,4 +466,38 @@ def test_get_connection_fail(monkeypatch):
         raise OperationalError("fail")
     monkeypatch.setattr(db.psycopg, "connect", fail_connect)
     with pytest.raises(OperationalError):
-        db.get_connection("bad_url")
+        with db.get_connection("bad_url"):
+            pass
+
+
+def test_open_pool_short_lease_timeout(monkeypatch):
+    created = []
+
+    class DummyPool:
+        def __init__(self, *args, **kwargs):
+            created.append(kwargs)
+
+        def open(self):
+            pass
+    monkeypatch.setattr(db, "ConnectionPool", DummyPool)
+    monkeypatch.setattr(db, "_POOLS", {})
+    db.open_pool("pooled_url")
+    db.open_pool("pooled_url")
+    # One pool per URL; leases fail fast instead of waiting psycopg_pool's default 30 seconds
+    assert len(created) == 1
+    assert created[0]["timeout"] == db.POOL_TIMEOUT
+
+
+def test_get_connection_uses_open_pool(monkeypatch):
+    conn = DummyConn()
+
+    class DummyPool:
+        def connection(self):
+            return contextlib.nullcontext(conn)
+
+    def fail_connect(*args, **kwargs):
+        raise AssertionError("should not open a dedicated connection")
+    monkeypatch.setattr(db.psycopg, "connect", fail_connect)
+    monkeypatch.setitem(db._POOLS, "pooled_url", DummyPool())
+    with db.get_connection("pooled_url") as leased:
+        assert leased is conn
@@ -1,3 +1,5 @@
+from datetime import datetime, timezone
+import polars as pl
 from app import transform
 
 
@@ -38,7 +40,9 @@ def test_flatten_observations_all_fields():
     }]
     df = transform.flatten_observations(obs)
     assert df["station_id"][0] == "KATL"
-    assert df["observation_timestamp"][0] == "2024-01-01T00:00:00Z"
+    # Parsed once into a UTC datetime
+    assert df["observation_timestamp"][0] == datetime(2024, 1, 1, tzinfo=timezone.utc)
+    assert df["observation_timestamp"].dtype == pl.Datetime("us", "UTC")
     assert df["temperature"][0] == 12.34
     assert df["wind_speed"][0] == 7.89
     assert df["relative_humidity"][0] == 55.55
@@ -99,3 +103,20 @@ def test_flatten_observations_multiple():
     assert df["precipitation_last_hour"][1] == 1.0
     assert df["dewpoint"][0] == 5.0
     assert df["dewpoint"][1] == 10.0
+
+
+def test_flatten_observations_rounding_and_sparse_fields():
+    obs = [
+        {"properties": {"station": "https://api.weather.gov/stations/KATL", "timestamp": "2024-01-01T00:00:00+00:00",
+                        "temperature": {"value": 10}}},
+        {"properties": {"station": "https://api.weather.gov/stations/KATL", "timestamp": "2024-01-01T00:00:00-05:00",
+                        "dewpoint": {"value": 1.23456}}},
+    ]
+    df = transform.flatten_observations(obs)
+    assert df["station_id"].to_list() == ["KATL", "KATL"]
+    # Ints are widened to float; fields missing from some observations are null there
+    assert df["temperature"].to_list() == [10.0, None]
+    assert df["dewpoint"].to_list() == [None, 1.23]
+    assert df["temperature"].dtype == df["dewpoint"].dtype == pl.Float64
+    # Offsets are normalized to UTC
+    assert df["observation_timestamp"].to_list() == [datetime(2024, 1, 1, 0, tzinfo=timezone.utc), datetime(2024, 1, 1, 5, tzinfo=timezone.utc)]